@@ -0,0 +1,283 @@
+"""Микробенчмарки сборки клавиатур: время одного вызова для 10…10 000 слотов.
+
+cd app
+python -m benchmarks.keyboards            # сравнить с baseline.json
+python -m benchmarks.keyboards --save     # записать новый baseline
+python -m benchmarks.keyboards --check    # код 1, если что-то медленнее порога
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import NamedTuple
+
+import aiogram
+
+from keyboards.admin_keyboards import (
+    get_admin_calendar_keyboard,
+    get_admin_shedule_slots_keyboard,
+)
+from keyboards.user_keyboards import (
+    get_all_user_lesson_keyboard,
+    get_slots_time_user_keyboard,
+    get_user_calendar_keyboard,
+)
+from config import ADMIN_ID
+from services.availability import availability
+from services.user_cache import user_ids
+
+BASELINE = Path(__file__).with_name("baseline.json")
+SIZES = (10, 100, 1000, 10_000)
+ADMIN_USER_ID = 1
+
+
+class Slot(NamedTuple):
+    # Те же поля, что у строк SLOT_COLUMNS, которые получают клавиатуры
+    id: int
+    start_time: datetime
+    end_time: datetime
+    student_id: int | None
+    is_booked: bool
+
+
+def make_slots(count: int) -> list[Slot]:
+    # По 12 часовых слотов в день начиная с завтра, статусы вперемешку
+    first_day = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+    first_day += timedelta(days=1)
+    slots = []
+    for i in range(count):
+        start = first_day + timedelta(days=i // 12, hours=i % 12)
+        student_id = None if i % 3 == 0 else 100 + i
+        slots.append(
+            Slot(i + 1, start, start + timedelta(hours=1), student_id, i % 3 == 2)
+        )
+    return slots
+
+
+class StubDb:
+    """Вместо AsyncSession для календаря ученика: отвечает на его запросы
+    из списка слотов, чтобы в замере был только Python"""
+
+    def __init__(self, slots: list[Slot]):
+        self.free_days = Counter(
+            slot.start_time.date() for slot in slots if slot.student_id is None
+        )
+
+    async def scalars(self, statement):
+        # Правила доступности (materialize_month): их нет
+        return []
+
+    async def scalar(self, statement):
+        # EXISTS свободных слотов в соседнем месяце
+        return bool(self.free_days)
+
+    async def execute(self, statement):
+        # Свободные слоты по дням (fetch_free_days)
+        return StubResult(list(self.free_days.items()))
+
+
+class StubResult:
+    def __init__(self, rows: list):
+        self.rows = rows
+
+    def all(self) -> list:
+        return self.rows
+
+
+def format_slot_times(slots: list[Slot]) -> list[str]:
+    # Только форматирование дат, как в кнопках слотов, — его доля в сборке
+    return [
+        f'{slot.start_time.strftime("%d-%m-%Y %H:%M")} - {slot.end_time.strftime("%H:%M")}'
+        for slot in slots
+    ]
+
+
+def user_calendar_case(slots: list[Slot]):
+    db = StubDb(slots)
+    first = slots[0].start_time
+    user_ids.put(ADMIN_ID, ADMIN_USER_ID)
+
+    async def run():
+        # Холодный индекс доступности: месяц каждый раз собирается из «базы»
+        availability.invalidate(ADMIN_USER_ID)
+        await get_user_calendar_keyboard(db, first.year, first.month)
+
+    return run
+
+
+def admin_calendar_case(slots: list[Slot]):
+    # Календарю админа слоты не нужны — размер не влияет, меряем для полноты
+    first = slots[0].start_time
+    return lambda: get_admin_calendar_keyboard(first.year, first.month)
+
+
+CASES = {
+    "format_slot_times": lambda slots: lambda: format_slot_times(slots),
+    "get_user_calendar_keyboard": user_calendar_case,
+    "get_admin_calendar_keyboard": admin_calendar_case,
+    "get_slots_time_user_keyboard": lambda slots: lambda: get_slots_time_user_keyboard(
+        slots
+    ),
+    "get_all_user_lesson_keyboard": lambda slots: lambda: get_all_user_lesson_keyboard(
+        slots
+    ),
+    "get_admin_shedule_slots_keyboard": lambda slots: lambda: get_admin_shedule_slots_keyboard(
+        slots, has_prev=True, has_next=True
+    ),
+}
+
+
+def measure(func, min_time: float, repeat: int, max_call: float) -> float:
+    """Лучшее из repeat время одного вызова; вызовов в замере столько,
+    чтобы он длился не меньше min_time. Вызов дольше max_call меряется без повторов"""
+    is_async = asyncio.iscoroutinefunction(func)
+    loop = asyncio.new_event_loop()
+
+    def timed(number: int) -> float:
+        if is_async:
+
+            async def batch():
+                started = time.perf_counter()
+                for _ in range(number):
+                    await func()
+                return time.perf_counter() - started
+
+            return loop.run_until_complete(batch())
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        return time.perf_counter() - started
+
+    try:
+        number = 1
+        while (elapsed := timed(number)) < min_time:
+            number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+        if elapsed / number > max_call:
+            return elapsed / number
+        return min([elapsed] + [timed(number) for _ in range(repeat - 1)]) / number
+    finally:
+        loop.close()
+
+
+def run_benchmarks(
+    cases: list[str], sizes: list[int], min_time: float, repeat: int, max_call: float
+) -> tuple[dict[str, float], dict[str, str]]:
+    """Замеры и пропущенные бенчмарки с причиной пропуска"""
+    results = {}
+    skipped = {}
+    too_slow = {}
+    for size in sorted(sizes):
+        slots = make_slots(size)
+        for name in cases:
+            key = f"{name}[{size}]"
+            # Квадратичная сборка на 10 000 слотов шла бы часами: если
+            # вызов уже дольше max_call, большие размеры не меряем
+            if name in too_slow:
+                skipped[key] = too_slow[name]
+                continue
+            results[key] = measure(CASES[name](slots), min_time, repeat, max_call)
+            if results[key] > max_call:
+                too_slow[name] = (
+                    f"{key}: {results[key]:.1f} с на вызов, "
+                    f"больше --max-call {max_call:g} с"
+                )
+    return results, skipped
+
+
+def load_baseline() -> dict:
+    if not BASELINE.exists():
+        return {"results": {}, "skipped": {}}
+    data = json.loads(BASELINE.read_text(encoding="utf-8"))
+    data.setdefault("skipped", {})
+    return data
+
+
+def save_baseline(results: dict[str, float], skipped: dict[str, str]):
+    # Частичный прогон (--case/--size) обновляет только свои замеры.
+    # Пропуск записывается с причиной, чтобы размер не пропадал молча
+    baseline = load_baseline()
+    data = {
+        "python": platform.python_version(),
+        "aiogram": aiogram.__version__,
+        "machine": platform.machine(),
+        "results": {
+            key: value
+            for key, value in {**baseline["results"], **results}.items()
+            if key not in skipped
+        },
+        "skipped": {
+            key: reason
+            for key, reason in {**baseline["skipped"], **skipped}.items()
+            if key not in results
+        },
+    }
+    BASELINE.write_text(
+        json.dumps(data, indent=2, ensure_ascii=False) + "\n", encoding="utf-8"
+    )
+
+
+def report(
+    results: dict[str, float],
+    skipped: dict[str, str],
+    baseline: dict[str, float],
+    threshold: float,
+):
+    """Печатает таблицу; возвращает замеры, которые медленнее baseline больше порога"""
+    slower = []
+    print(f"{'бенчмарк':<45}{'мкс/вызов':>12}{'baseline':>12}{'×':>8}")
+    for key, seconds in results.items():
+        line = f"{key:<45}{seconds * 1e6:>12.1f}"
+        if key in baseline:
+            ratio = seconds / baseline[key]
+            line += f"{baseline[key] * 1e6:>12.1f}{ratio:>8.2f}"
+            if ratio > threshold:
+                slower.append(key)
+                line += "  ← медленнее"
+        print(line)
+    for key, reason in skipped.items():
+        print(f"{key:<45}{'пропущен':>12}  ({reason})")
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--save", action="store_true", help="записать baseline.json")
+    parser.add_argument(
+        "--check", action="store_true", help="код 1 при замедлении больше порога"
+    )
+    parser.add_argument("--threshold", type=float, default=1.5)
+    parser.add_argument("--case", action="append", choices=list(CASES))
+    parser.add_argument("--size", action="append", type=int)
+    parser.add_argument("--min-time", type=float, default=0.2)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--max-call",
+        type=float,
+        default=2.0,
+        help="если вызов дольше (с), большие размеры этого бенчмарка пропускаются",
+    )
+    args = parser.parse_args()
+
+    results, skipped = run_benchmarks(
+        args.case or list(CASES),
+        args.size or list(SIZES),
+        args.min_time,
+        args.repeat,
+        args.max_call,
+    )
+    slower = report(results, skipped, load_baseline()["results"], args.threshold)
+    if args.save:
+        save_baseline(results, skipped)
+        print(f"\nBaseline записан в {BASELINE}")
+    elif args.check and slower:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
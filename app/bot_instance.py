@@ -1,10 +1,17 @@
 from aiogram import Bot, Dispatcher
-import os
-from dotenv import load_dotenv
 
+from config import TOKEN
+from fsm_storage import build_storage
 
-load_dotenv()
-TOKEN = os.getenv("TOKEN")
+# FSMContextMiddleware подключает create_app после метрик: чтение
+# состояния тоже запрос к базе, и он должен попасть в метрики апдейта
+dp = Dispatcher(storage=build_storage(), disable_fsm=True)
+_bot: Bot | None = None
 
-bot = Bot(token=TOKEN)
-dp = Dispatcher()
+
+def get_bot() -> Bot:
+    # Bot создаётся при первом обращении: импорт модулей не требует токена
+    global _bot
+    if _bot is None:
+        _bot = Bot(token=TOKEN)
+    return _bot
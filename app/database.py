@@ -1,23 +1,134 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from config import DB_URL
+import os
+from typing import Callable
 
-DATABASE_URL = DB_URL
+from sqlalchemy import event, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import Session, declarative_base
+from config import (
+    DB_MAX_OVERFLOW,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_URL,
+)
+
+# Асинхронный драйвер, чтобы запросы не блокировали event loop
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+DATABASE_URL = make_url(DB_URL)
+DATABASE_URL = DATABASE_URL.set(
+    drivername=ASYNC_DRIVERS[DATABASE_URL.get_backend_name()]
+)
+
+
+def _engine_options() -> dict:
+    if DATABASE_URL.get_backend_name() == "sqlite":
+        # SQLite (нагрузочный тест, локальный запуск) — пул по умолчанию:
+        # для :memory: это StaticPool, которому размеры пула не передаются
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        # Хостинг рвёт простаивающие соединения — пересоздаём их заранее
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+# Сессии привязываются к движку в get_engine: импорт модулей базу не трогает
+SessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False)
+_engine: AsyncEngine | None = None
+
+
+def get_engine() -> AsyncEngine:
+    # Движок создаётся при первом обращении (create_app, миграции)
+    global _engine
+    if _engine is None:
+        _engine = create_async_engine(DATABASE_URL, **_engine_options())
+        SessionLocal.configure(bind=_engine)
+    return _engine
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+
+
+class SchemaVersionError(RuntimeError):
+    pass
+
+
+def _upgrade_to_head(connection):
+    # Alembic нужен только миграциям — импорт не замедляет обычный старт
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(ALEMBIC_INI)
+    config.attributes["connection"] = connection
+    command.upgrade(config, "head")
+
+
+async def run_migrations():
+    # То же, что `alembic upgrade head`, но на соединении бота
+    async with get_engine().begin() as conn:
+        await conn.run_sync(_upgrade_to_head)
+
+
+def schema_head() -> str:
+    # Ревизия, до которой код ожидает базу: head в migrations/versions
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    return ScriptDirectory.from_config(Config(ALEMBIC_INI)).get_current_head()
+
+
+async def check_schema():
+    """Один запрос вместо миграций при старте: ревизия базы должна совпадать с кодом"""
+    expected = schema_head()
+    # Недоступная база падает здесь, а не сообщением про ревизию
+    async with get_engine().connect() as conn:
+        try:
+            current = await conn.scalar(text("SELECT version_num FROM alembic_version"))
+        except DBAPIError:
+            # Таблицы нет — миграции не применялись ни разу
+            current = None
+    if current != expected:
+        # Бот дальше не стартует: закрываем пул, иначе потоки aiosqlite
+        # не дадут процессу завершиться
+        await get_engine().dispose()
+        raise SchemaVersionError(
+            f"База на ревизии {current}, код ожидает {expected}: "
+            "выполните `python main.py migrate`"
+        )
+
+
+def on_commit(db: AsyncSession, callback: Callable[[], None]):
+    # Отложенное действие: выполнится только если транзакция закоммитится
+    db.info.setdefault("on_commit", []).append(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_commit_hooks(session: Session):
+    for callback in session.info.pop("on_commit", []):
+        callback()
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_commit_hooks(session: Session):
+    session.info.pop("on_commit", None)
 
 
-def create_tables():
-    Base.metadata.create_all(bind=engine)
+def dialect_insert(db: AsyncSession, table):
+    # INSERT ... ON CONFLICT у PostgreSQL и SQLite строится разными конструкциями
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
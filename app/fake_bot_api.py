@@ -0,0 +1,140 @@
+import asyncio
+import itertools
+import time
+from collections import Counter, deque
+
+from aiohttp import web
+
+# Заглушка Bot API для нагрузочного теста и тестов: отдаёт подготовленные
+# апдейты через getUpdates и на всё остальное отвечает успехом, ничего не
+# отправляя. UpdateFactory собирает такие апдейты.
+
+
+class FakeBotApi:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.calls: Counter[str] = Counter()
+        # Параметры последнего вызова каждого метода — для проверок в тестах
+        self.last: dict[str, dict] = {}
+        self._updates: deque[dict] = deque()
+        self._has_updates = asyncio.Event()
+        self._message_ids = itertools.count(1)
+        self._runner: web.AppRunner | None = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def push(self, updates: list[dict]):
+        self._updates.extend(updates)
+        self._has_updates.set()
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # port=0 — свободный порт выбирает система
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        self.calls[method] += 1
+        params = dict(await request.post())
+        self.last[method] = params
+        if method == "getupdates":
+            result = await self._get_updates(params)
+        elif method == "getme":
+            result = {
+                "id": 1,
+                "is_bot": True,
+                "first_name": "LoadTest",
+                "username": "loadtest_bot",
+            }
+        elif method in ("sendmessage", "editmessagetext", "editmessagereplymarkup"):
+            result = self._message(params)
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def _get_updates(self, params: dict) -> list[dict]:
+        # Как у Telegram: offset подтверждает всё, что было до него
+        offset = int(params.get("offset") or 0)
+        while self._updates and self._updates[0]["update_id"] < offset:
+            self._updates.popleft()
+        if not self._updates:
+            self._has_updates.clear()
+            try:
+                await asyncio.wait_for(
+                    self._has_updates.wait(), float(params.get("timeout") or 0)
+                )
+            except asyncio.TimeoutError:
+                return []
+        limit = int(params.get("limit") or 100)
+        return list(itertools.islice(self._updates, limit))
+
+    def _message(self, params: dict) -> dict:
+        chat_id = int(params.get("chat_id") or 0)
+        return {
+            "message_id": int(params.get("message_id") or next(self._message_ids)),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": params.get("text", ""),
+        }
+
+
+class UpdateFactory:
+    """JSON апдейтов в том виде, в каком их отдаёт getUpdates"""
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+
+    def _user(self, telegram_id: int) -> dict:
+        return {
+            "id": telegram_id,
+            "is_bot": False,
+            "first_name": f"User{telegram_id}",
+            "username": f"user{telegram_id}",
+        }
+
+    def message(self, telegram_id: int, text: str) -> dict:
+        update_id = next(self._ids)
+        message = {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": telegram_id, "type": "private"},
+            "from": self._user(telegram_id),
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [
+                {"type": "bot_command", "offset": 0, "length": len(text)}
+            ]
+        return {"update_id": update_id, "message": message}
+
+    def callback(self, telegram_id: int, data: str) -> dict:
+        update_id = next(self._ids)
+        return {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id),
+                "from": self._user(telegram_id),
+                "chat_instance": str(telegram_id),
+                "data": data,
+                "message": {
+                    "message_id": update_id,
+                    "date": int(time.time()),
+                    "chat": {"id": telegram_id, "type": "private"},
+                    "from": {"id": 1, "is_bot": True, "first_name": "LoadTest"},
+                    "text": "...",
+                },
+            },
+        }
@@ -0,0 +1,139 @@
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import (
+    BaseStorage,
+    DefaultKeyBuilder,
+    KeyBuilder,
+    StateType,
+    StorageKey,
+)
+from aiogram.fsm.storage.memory import MemoryStorage
+from sqlalchemy import case, delete, select
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from config import FSM_CACHE_SIZE, FSM_STORAGE, FSM_TTL, REDIS_URL
+from database import SessionLocal, dialect_insert
+from models import FsmState
+
+
+class DbStorage(BaseStorage):
+    """FSM в таблице fsm_states: переживает перезапуск и общая для всех воркеров.
+
+    Большинство апдейтов приходит от пользователей без состояния, а FSM
+    читает его на каждый апдейт. Ключи без состояния помнятся в процессе
+    (до cache_size штук), и для них запроса нет. Это верно, пока апдейты
+    одного пользователя обрабатывает один процесс (polling, WORKERS), поэтому
+    по умолчанию кэш включён только в этих режимах (FSM_CACHE_SIZE)."""
+
+    def __init__(
+        self,
+        session_pool: async_sessionmaker,
+        ttl: int,
+        key_builder: Optional[KeyBuilder] = None,
+        cache_size: int = FSM_CACHE_SIZE,
+    ):
+        self.session_pool = session_pool
+        self.ttl = timedelta(seconds=ttl)
+        self.key_builder = key_builder or DefaultKeyBuilder()
+        self.cache_size = cache_size
+        self._purged_at = 0.0
+        # Ключи, у которых точно нет ни состояния, ни данных (LRU)
+        self._empty: OrderedDict[str, None] = OrderedDict()
+        # Растёт при каждой записи: чтение, с которым пересеклась запись,
+        # не кэшируется — иначе оно затёрло бы только что заданное состояние
+        self._writes = 0
+
+    async def _load(self, key: StorageKey) -> Optional[Row]:
+        storage_key = self.key_builder.build(key)
+        if storage_key in self._empty:
+            self._empty.move_to_end(storage_key)
+            return None
+        writes = self._writes
+        async with self.session_pool() as db:
+            row = (
+                await db.execute(
+                    select(FsmState.state, FsmState.data).where(
+                        FsmState.key == storage_key,
+                        FsmState.expires_at > datetime.now(),
+                    )
+                )
+            ).first()
+        if row is None or (row.state is None and not row.data):
+            if writes == self._writes and self.cache_size:
+                self._empty[storage_key] = None
+                if len(self._empty) > self.cache_size:
+                    self._empty.popitem(last=False)
+            return None
+        return row
+
+    async def _save(self, key: StorageKey, **values: Any) -> None:
+        now = datetime.now()
+        storage_key = self.key_builder.build(key)
+        self._writes += 1
+        self._empty.pop(storage_key, None)
+        async with self.session_pool.begin() as db:
+            stmt = dialect_insert(db, FsmState.__table__).values(
+                key=storage_key,
+                expires_at=now + self.ttl,
+                **{"state": None, "data": {}, **values},
+            )
+            fresh = FsmState.expires_at > now
+            update_values = {"expires_at": stmt.excluded.expires_at}
+            for name in ("state", "data"):
+                if name in values:
+                    update_values[name] = stmt.excluded[name]
+                else:
+                    # Из истёкшей записи не тянем старое состояние или данные
+                    update_values[name] = case(
+                        (fresh, FsmState.__table__.c[name]), else_=stmt.excluded[name]
+                    )
+            await db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[FsmState.key], set_=update_values
+                )
+            )
+            await self._purge_expired(db, now)
+        # Чтение, прошедшее целиком до коммита, могло запомнить ключ пустым
+        self._writes += 1
+        self._empty.pop(storage_key, None)
+
+    async def _purge_expired(self, db, now: datetime) -> None:
+        # Брошенные состояния чистим не чаще раза в ttl
+        if time.monotonic() - self._purged_at < self.ttl.total_seconds():
+            return
+        self._purged_at = time.monotonic()
+        await db.execute(delete(FsmState).where(FsmState.expires_at <= now))
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._save(key, state=state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        row = await self._load(key)
+        return row.state if row else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self._save(key, data=data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        row = await self._load(key)
+        return dict(row.data) if row else {}
+
+    async def close(self) -> None:
+        pass
+
+
+def build_storage() -> BaseStorage:
+    # FSM_STORAGE: db (по умолчанию), redis или memory (для тестов и локального запуска)
+    if FSM_STORAGE == "redis":
+        # redis не входит в базовые зависимости: pip install redis
+        from aiogram.fsm.storage.redis import RedisStorage
+
+        return RedisStorage.from_url(REDIS_URL, state_ttl=FSM_TTL, data_ttl=FSM_TTL)
+    if FSM_STORAGE == "memory":
+        return MemoryStorage()
+    return DbStorage(SessionLocal, FSM_TTL)
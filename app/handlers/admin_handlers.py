@@ -1,12 +1,12 @@
-from aiogram import Router
-
 from datetime import datetime
-import re
-from aiogram import F, types
+from aiogram import types
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 from aiogram.fsm.context import FSMContext
 
-from config import ADMIN_ID
+from config import ADMIN_ID, SCHEDULE_PAGE_SIZE
+from handlers.routing import PrefixRouter
 from handlers.states import ScheduleStates
 from keyboards.admin_keyboards import (
     get_admin_accept_or_reject_slot_keyboard,
@@ -17,21 +17,42 @@ from keyboards.admin_keyboards import (
     get_admin_shedule_slots_keyboard,
 )
 
-from database import get_db
 
+from keyboards.callbacks import (
+    ApproveSlot,
+    CancelBookedSlot,
+    ChangeMonth,
+    DeleteSlot,
+    RejectSlot,
+    SchedulePage,
+    SelectDate,
+    SelectedSlot,
+)
 from keyboards.common_keyboards import (
     get_back_to_menu_keyboard,
     get_ok_to_menu_keyboard,
 )
-from models import TimeSlot, User
-
-from bot_instance import bot
-
+from models import TimeSlot
+
+from services.notifier import notifier
+from services.reminders import reminders
+from services.availability import slot_freed, slot_taken
+from services.slots import (
+    SCHEDULE_FILTERS,
+    approve_slot,
+    cancel_lesson,
+    create_slots,
+    delete_free_slot,
+    get_schedule_page,
+    parse_time_ranges,
+    reject_slot,
+)
+from services.user_cache import get_user_id
 
-admin_router = Router()
+admin_router = PrefixRouter()
 
 
-@admin_router.callback_query(F.data == "add_schedule")
+@admin_router.callback("add_schedule", flags={"query_budget": 0})
 async def add_schedule_handler(callback: types.CallbackQuery):
     await callback.answer()
     await callback.message.edit_text(
@@ -40,23 +61,28 @@ async def add_schedule_handler(callback: types.CallbackQuery):
     )
 
 
-@admin_router.callback_query(F.data.startswith("change_month:"))
-async def change_month_handler(callback: types.CallbackQuery):
-    _, year_month = callback.data.split(":")
-    year, month = map(int, year_month.split("-"))
+@admin_router.callback(ChangeMonth, flags={"query_budget": 0})
+async def change_month_handler(
+    callback: types.CallbackQuery, callback_data: ChangeMonth
+):
     await callback.message.edit_reply_markup(
-        reply_markup=get_admin_calendar_keyboard(year, month)
+        reply_markup=get_admin_calendar_keyboard(
+            callback_data.year, callback_data.month
+        )
     )
     await callback.answer()
 
 
-@admin_router.callback_query(F.data.startswith("select_date:"))
-async def select_date_handler(callback: types.CallbackQuery, state: FSMContext):
-    _, date_str = callback.data.split(":")
+@admin_router.callback(SelectDate, flags={"query_budget": 4})
+async def select_date_handler(
+    callback: types.CallbackQuery, callback_data: SelectDate, state: FSMContext
+):
+    date_str = callback_data.day
     await state.update_data(selected_date=date_str)
 
     await callback.message.edit_text(
-        f"Введите время для {date_str} в формате HH:MM - HH:MM, например, 12:00 - 13:00.",
+        f"Введите время для {date_str} в формате HH:MM - HH:MM, например, 12:00 - 13:00.\n"
+        "Можно сразу несколько интервалов: по одному на строку или через запятую.",
         reply_markup=get_back_to_menu_keyboard(),
     )
     await state.set_state(ScheduleStates.waiting_for_time)
@@ -135,351 +161,314 @@ async def select_date_handler(callback: types.CallbackQuery, state: FSMContext):
 #         await state.clear()
 
 
-@admin_router.message(ScheduleStates.waiting_for_time)
-async def process_time_input(message: types.Message, state: FSMContext):
-    time_pattern = re.compile(r"^\d{2}:\d{2} - \d{2}:\d{2}$")
-
+@admin_router.message(ScheduleStates.waiting_for_time, flags={"query_budget": 6})
+async def process_time_input(
+    message: types.Message, state: FSMContext, db: AsyncSession
+):
     # Сохраняем состояние перед проверками
     data = await state.get_data()
     date_str = data["selected_date"]
 
-    if not time_pattern.match(message.text):
+    ranges, invalid = parse_time_ranges(date_str, message.text or "")
+    if not ranges:
         await message.answer(
-            "Неверный формат времени. Пожалуйста, введите время в формате HH:MM - HH:MM, например, 12:00 - 13:00.",
+            "Неверный формат времени. Пожалуйста, введите время в формате HH:MM - HH:MM, "
+            "можно несколько интервалов по одному на строку или через запятую, например:\n"
+            "12:00 - 13:00, 14:00 - 15:00",
             reply_markup=get_back_to_menu_keyboard(),
         )
         # Состояние остается активным для повторного ввода
         return
 
-    try:
-        # Разбираем введенное время
-        start_time_str, end_time_str = message.text.split(" - ")
-        date_format = "%d-%m-%Y %H:%M"
-
-        start_datetime = datetime.strptime(f"{date_str} {start_time_str}", date_format)
-        end_datetime = datetime.strptime(f"{date_str} {end_time_str}", date_format)
-
-        # Проверяем, что время окончания позже времени начала
-        if end_datetime <= start_datetime:
-            await message.answer(
-                "Ошибка: время окончания должно быть позже времени начала.\n"
-                "Пожалуйста, введите время заново:",
-                reply_markup=get_back_to_menu_keyboard(),
-            )
-            # Состояние остается активным для повторного ввода
-            return
-
-        db = next(get_db())
-        try:
-            admin = db.query(User).filter(User.telegram_id == ADMIN_ID).first()
-            # Проверяем на существующий слот
-            existing_slot = (
-                db.query(TimeSlot)
-                .filter(
-                    TimeSlot.start_time == start_datetime,
-                    TimeSlot.end_time == end_datetime,
-                    TimeSlot.admin_id == admin.id,
-                )
-                .first()
-            )
-
-            if existing_slot:
-                await message.answer(
-                    "⚠️ Такой временной слот уже существует!\n"
-                    f"Дата: {date_str}\n"
-                    f"Время: {message.text}\n\n"
-                    "Пожалуйста, введите другое время:",
-                    reply_markup=get_back_to_menu_keyboard(),
-                )
-                # Состояние остается активным для повторного ввода
-                return
-
-            # Создаем новый слот
-
-            new_slot = TimeSlot(
-                start_time=start_datetime,
-                end_time=end_datetime,
-                is_booked=False,
-                admin_id=admin.id,
-            )
-            db.add(new_slot)
-            db.commit()
-
-            await message.answer(
-                f"Слот успешно добавлен: {date_str} {message.text} ✅",
-                reply_markup=get_admin_keyboard(),
-            )
-            await state.clear()  # Очищаем состояние только при успешном добавлении
-
-        except Exception as e:
-            await message.answer(
-                f"Произошла ошибка: {str(e)}\n" "Пожалуйста, попробуйте еще раз:",
-                reply_markup=get_back_to_menu_keyboard(),
-            )
-            # Состояние остается активным для повторного ввода
-            return
-        finally:
-            db.close()
+    admin_id = await get_user_id(db, ADMIN_ID)
+    if admin_id is None:
+        await message.answer("Ошибка: администратор не найден в базе данных.")
+        return
 
-    except ValueError as e:
+    try:
+        # Все интервалы одним запросом, дубли и пересечения пропускаются базой
+        created = await create_slots(db, admin_id, ranges)
+        for slot in created:
+            slot_freed(db, slot)
+        # Слоты фиксируем до очистки FSM: хранилище пишет своей транзакцией
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
         await message.answer(
-            f"Ошибка формата: {str(e)}\n"
-            "Пожалуйста, введите время заново в формате HH:MM - HH:MM:",
+            f"Произошла ошибка: {str(e)}\n" "Пожалуйста, попробуйте еще раз:",
             reply_markup=get_back_to_menu_keyboard(),
         )
         # Состояние остается активным для повторного ввода
         return
 
+    created_ranges = {(slot.start_time, slot.end_time) for slot in created}
+    conflicts = [r for r in ranges if r not in created_ranges]
+
+    lines = []
+    if created:
+        lines.append(f"Слоты успешно добавлены на {date_str} ✅")
+        lines += [format_time_range(slot.start_time, slot.end_time) for slot in created]
+    if conflicts:
+        lines.append("\n⚠️ Совпадают или пересекаются с другими слотами:")
+        lines += [format_time_range(start, end) for start, end in conflicts]
+    if invalid:
+        lines.append("\n❌ Не распознаны (нужно HH:MM - HH:MM):")
+        lines += invalid
+
+    text = "\n".join(lines).strip()
+
+    if not created:
+        text += "\n\nПожалуйста, введите другое время:"
+        await message.answer(text, reply_markup=get_back_to_menu_keyboard())
+        # Состояние остается активным для повторного ввода
+        return
 
-@admin_router.callback_query(F.data == "view_schedule")
-async def view_schedule_handler(callback: types.CallbackQuery):
-    await callback.answer()
+    await message.answer(text, reply_markup=get_admin_keyboard())
+    await state.clear()  # Очищаем состояние только при успешном добавлении
 
-    db = next(get_db())
 
-    try:
-        # Находим текущего администратора
-        admin = db.query(User).filter(User.telegram_id == callback.from_user.id).first()
+def format_time_range(start: datetime, end: datetime) -> str:
+    return f"{start:%H:%M} - {end:%H:%M}"
 
-        # admin = db.query(User).filter(User.telegram_id == ADMIN_ID).first()
-        if not admin:
-            await callback.message.answer(
-                "Ошибка: администратор не найден в базе данных."
-            )
-            return
-        # Получаем все слоты, которые создал этот админ
-        slots = (
-            db.query(TimeSlot)
-            .options(joinedload(TimeSlot.student))
-            .filter(TimeSlot.admin_id == admin.id)
-            .order_by(TimeSlot.start_time)
-            .all()
-        )
 
-        if not slots:
-            await callback.message.edit_text(
-                "У вас пока нет созданных слотов.",
-                reply_markup=get_back_to_menu_keyboard(),
-            )
-            return
+async def show_schedule_page(
+    callback: types.CallbackQuery,
+    db: AsyncSession,
+    status: str = "all",
+    cursor: tuple[datetime, int] | None = None,
+    backward: bool = False,
+):
+    # Находим текущего администратора
+    admin_id = await get_user_id(db, callback.from_user.id)
+
+    # admin = db.query(User).filter(User.telegram_id == ADMIN_ID).first()
+    if admin_id is None:
+        await callback.message.answer("Ошибка: администратор не найден в базе данных.")
+        return
+    # Одна страница слотов этого админа
+    slots, has_prev, has_next = await get_schedule_page(
+        db, admin_id, status, cursor, backward, SCHEDULE_PAGE_SIZE
+    )
 
+    if not slots and status == "all" and cursor is None:
         await callback.message.edit_text(
-            "Ваше текущее расписание (нажмите, чтобы посмотреть информацию):",
-            reply_markup=get_admin_shedule_slots_keyboard(slots),
+            "У вас пока нет созданных слотов.",
+            reply_markup=get_back_to_menu_keyboard(),
         )
+        return
 
-    finally:
-        db.close()
+    await callback.message.edit_text(
+        (
+            "Нет слотов с таким статусом."
+            if not slots
+            else (
+                "Прошедшие слоты из архива:"
+                if status == "history"
+                else "Ваше текущее расписание (нажмите, чтобы посмотреть информацию):"
+            )
+        ),
+        reply_markup=get_admin_shedule_slots_keyboard(
+            slots, status, has_prev, has_next
+        ),
+    )
 
 
-@admin_router.callback_query(F.data.startswith("selected_slot:"))
-async def delete_slot_handler(callback: types.CallbackQuery):
+@admin_router.callback("view_schedule", flags={"query_budget": 2})
+async def view_schedule_handler(callback: types.CallbackQuery, db: AsyncSession):
     await callback.answer()
+    await show_schedule_page(callback, db)
 
-    slot_id = int(callback.data.split(":")[1])
 
-    db = next(get_db())
+@admin_router.callback(SchedulePage, flags={"query_budget": 2})
+async def schedule_page_handler(
+    callback: types.CallbackQuery, callback_data: SchedulePage, db: AsyncSession
+):
+    await callback.answer()
 
-    try:
-        slot = (
-            db.query(TimeSlot)
-            .options(joinedload(TimeSlot.student))
-            .filter(TimeSlot.id == slot_id)
-            .first()
+    status = callback_data.status
+    if status not in SCHEDULE_FILTERS:
+        status = "all"
+
+    await show_schedule_page(
+        callback, db, status, callback_data.cursor, callback_data.direction == "prev"
+    )
+
+
+@admin_router.callback(SelectedSlot, flags={"query_budget": 1})
+async def delete_slot_handler(
+    callback: types.CallbackQuery, callback_data: SelectedSlot, db: AsyncSession
+):
+    slot_id = callback_data.slot_id
+
+    slot = await db.scalar(
+        select(TimeSlot)
+        .options(joinedload(TimeSlot.student))
+        .where(TimeSlot.id == slot_id)
+    )
+    # Кнопка могла остаться от слота, который уже удалён или ушёл в архив
+    if not slot:
+        await callback.answer("Ошибка: слот не найден.", show_alert=True)
+        return
+    await callback.answer()
+
+    start = slot.start_time.strftime("%d-%m-%Y %H:%M")
+    end = slot.end_time.strftime("%H:%M")
+    date_str = f"{start} - {end}"
+
+    has_student = slot.student_id != None
+    # Если есть студент
+    if has_student:
+        student = slot.student
+
+        student_info = (
+            f"@{student.username}"
+            if student.username
+            else f"{student.full_name} (ID: {student.id})"
         )
-        start = slot.start_time.strftime("%d-%m-%Y %H:%M")
-        end = slot.end_time.strftime("%H:%M")
-        date_str = f"{start} - {end}"
-
-        has_student = slot.student_id != None
-        if not slot:
-            await callback.message.answer("Ошибка: слот не найден.")
-            return
-        # Если есть студент
-        if has_student:
-            student = slot.student
-
-            student_info = (
-                f"@{student.username}"
-                if student.username
-                else f"{student.full_name} (ID: {student.id})"
+        # Если слот занят студентом
+        if slot.is_booked == True:
+            await callback.message.edit_text(
+                f"Запись на {date_str}\n Студент: {student_info}",
+                reply_markup=get_admin_cancel_selected_slot_keyboard(slot_id),
             )
-            # Если слот занят студентом
-            if slot.is_booked == True:
-                await callback.message.edit_text(
-                    f"Запись на {date_str}\n Студент: {student_info}",
-                    reply_markup=get_admin_cancel_selected_slot_keyboard(slot_id),
-                )
-            else:
-                # Если слот в ожидании
-                await callback.message.edit_text(
-                    f"Запись на {date_str}\n"
-                    f"Статус: В ожидании\n Студент: @{student_info}",
-                    reply_markup=get_admin_accept_or_reject_slot_keyboard(slot_id),
-                )
-
         else:
-            # Если слот свободен
+            # Если слот в ожидании
             await callback.message.edit_text(
-                f"Запись на {date_str}\n" f"Статус: Свободна",
-                reply_markup=get_admin_delete_selected_slot_keyboard(slot_id),
+                f"Запись на {date_str}\n"
+                f"Статус: В ожидании\n Студент: @{student_info}",
+                reply_markup=get_admin_accept_or_reject_slot_keyboard(slot_id),
             )
-    finally:
-        db.close()
 
+    else:
+        # Если слот свободен
+        await callback.message.edit_text(
+            f"Запись на {date_str}\n" f"Статус: Свободна",
+            reply_markup=get_admin_delete_selected_slot_keyboard(slot_id),
+        )
 
-@admin_router.callback_query(F.data.startswith("delete_slot:"))
-async def delete_slot_handler(callback: types.CallbackQuery):
-    await callback.answer()
 
-    slot_id = int(callback.data.split(":")[1])
+@admin_router.callback(DeleteSlot, flags={"query_budget": 1})
+async def delete_slot_handler(
+    callback: types.CallbackQuery, callback_data: DeleteSlot, db: AsyncSession
+):
+    await callback.answer()
 
-    db = next(get_db())
+    slot_id = callback_data.slot_id
 
-    try:
-        slot = db.query(TimeSlot).filter(TimeSlot.id == slot_id).first()
+    slot = await delete_free_slot(db, slot_id)
 
-        if not slot:
-            await callback.message.answer("Ошибка: слот не найден.")
-            return
+    if not slot:
+        await callback.message.answer(
+            "Ошибка: слот не найден или на него уже записались."
+        )
+        return
 
-        db.delete(slot)
-        db.commit()
+    slot_taken(db, slot)
+    reminders.cancel_after_commit(db, slot.id)
 
-        await callback.message.edit_text(
-            "Слот успешно удалён ✅", reply_markup=get_ok_to_menu_keyboard()
-        )
+    await callback.message.edit_text(
+        "Слот успешно удалён ✅", reply_markup=get_ok_to_menu_keyboard()
+    )
 
-    finally:
-        db.close()
     # await view_schedule_handler(callback)
 
 
-@admin_router.callback_query(F.data.startswith("is_booked_slot:"))
-async def delete_slot_handler(callback: types.CallbackQuery):
+@admin_router.callback(ApproveSlot, flags={"query_budget": 2})
+async def delete_slot_handler(
+    callback: types.CallbackQuery, callback_data: ApproveSlot, db: AsyncSession
+):
     await callback.answer()
 
-    slot_id = int(callback.data.split(":")[1])
-
-    db = next(get_db())
+    slot_id = callback_data.slot_id
 
-    try:
-        slot = (
-            db.query(TimeSlot)
-            .options(joinedload(TimeSlot.student))
-            .filter(TimeSlot.id == slot_id)
-            .first()
-        )
+    slot = await approve_slot(db, slot_id)
 
-        if not slot:
-            await callback.message.answer("Ошибка: слот не найден.")
-            return
+    if not slot:
+        await callback.message.answer("Ошибка: заявка не найдена или уже обработана.")
+        return
 
-        chat_id = slot.student.telegram_id
-        start = slot.start_time.strftime("%d-%m-%Y %H:%M")
-        end = slot.end_time.strftime("%H:%M")
-        date_str = f"{start} - {end}"
+    reminders.schedule_after_commit(db, slot)
 
-        slot.is_booked = True
-        db.commit()
+    chat_id = slot.telegram_id
+    start = slot.start_time.strftime("%d-%m-%Y %H:%M")
+    end = slot.end_time.strftime("%H:%M")
+    date_str = f"{start} - {end}"
 
-        await callback.message.edit_text(
-            f"Отлично! Вы приняли слот на {date_str}, удачной работы)",
-            reply_markup=get_ok_to_menu_keyboard(),
-        )
+    await callback.message.edit_text(
+        f"Отлично! Вы приняли слот на {date_str}, удачной работы)",
+        reply_markup=get_ok_to_menu_keyboard(),
+    )
 
-        print(chat_id)
-        await bot.send_message(
-            chat_id=chat_id,
-            text=f"Администратор одобрил ващу заявку на {date_str}, хороших уроков",
-            reply_markup=get_ok_to_menu_keyboard(),
-        )
-    finally:
-        db.close()
+    notifier.send_after_commit(
+        db,
+        chat_id=chat_id,
+        text=f"Администратор одобрил ващу заявку на {date_str}, хороших уроков",
+        reply_markup=get_ok_to_menu_keyboard(),
+    )
 
 
-@admin_router.callback_query(F.data.startswith("cancel_booked_slot:"))
-async def delete_slot_handler(callback: types.CallbackQuery):
+@admin_router.callback(RejectSlot, flags={"query_budget": 2})
+async def delete_slot_handler(
+    callback: types.CallbackQuery, callback_data: RejectSlot, db: AsyncSession
+):
     await callback.answer()
 
-    slot_id = int(callback.data.split(":")[1])
-
-    db = next(get_db())
-
-    try:
-        slot = (
-            db.query(TimeSlot)
-            .options(joinedload(TimeSlot.student))
-            .filter(TimeSlot.id == slot_id)
-            .first()
-        )
+    slot_id = callback_data.slot_id
 
-        if not slot:
-            await callback.message.answer("Ошибка: слот не найден.")
-            return
+    slot = await reject_slot(db, slot_id)
 
-        chat_id = slot.student.telegram_id
-        start = slot.start_time.strftime("%d-%m-%Y %H:%M")
-        end = slot.end_time.strftime("%H:%M")
-        date_str = f"{start} - {end}"
+    if not slot:
+        await callback.message.answer("Ошибка: заявка не найдена или уже обработана.")
+        return
 
-        slot.student_id = None
-        db.commit()
+    slot_freed(db, slot)
 
-        await callback.message.edit_text(
-            f"Вы отменили слот на {date_str}\n На него все ещё могут записаться другие пользователи!",
-            reply_markup=get_ok_to_menu_keyboard(),
-        )
-        print(chat_id)
-        await bot.send_message(
-            chat_id=chat_id,
-            text=f"Администратор отменил ващу заявку на {date_str}",
-            reply_markup=get_ok_to_menu_keyboard(),
-        )
+    chat_id = slot.telegram_id
+    start = slot.start_time.strftime("%d-%m-%Y %H:%M")
+    end = slot.end_time.strftime("%H:%M")
+    date_str = f"{start} - {end}"
 
-    finally:
-        db.close()
+    await callback.message.edit_text(
+        f"Вы отменили слот на {date_str}\n На него все ещё могут записаться другие пользователи!",
+        reply_markup=get_ok_to_menu_keyboard(),
+    )
+    notifier.send_after_commit(
+        db,
+        chat_id=chat_id,
+        text=f"Администратор отменил ващу заявку на {date_str}",
+        reply_markup=get_ok_to_menu_keyboard(),
+    )
 
 
-@admin_router.callback_query(F.data.startswith("cansel_user_selected_slot:"))
-async def delete_slot_handler(callback: types.CallbackQuery):
+@admin_router.callback(CancelBookedSlot, flags={"query_budget": 2})
+async def delete_slot_handler(
+    callback: types.CallbackQuery, callback_data: CancelBookedSlot, db: AsyncSession
+):
     await callback.answer()
 
-    slot_id = int(callback.data.split(":")[1])
+    slot_id = callback_data.slot_id
 
-    db = next(get_db())
+    slot = await cancel_lesson(db, slot_id)
 
-    try:
-        slot = (
-            db.query(TimeSlot)
-            .options(joinedload(TimeSlot.student))
-            .filter(TimeSlot.id == slot_id)
-            .first()
-        )
-
-        if not slot:
-            await callback.message.answer("Ошибка: слот не найден.")
-            return
+    if not slot:
+        await callback.message.answer("Ошибка: занятие не найдено или уже отменено.")
+        return
 
-        chat_id = slot.student.telegram_id
-        start = slot.start_time.strftime("%d-%m-%Y %H:%M")
-        end = slot.end_time.strftime("%H:%M")
-        date_str = f"{start} - {end}"
+    slot_freed(db, slot)
+    reminders.cancel_after_commit(db, slot.id)
 
-        slot.student_id = None
-        slot.is_booked = False
-        db.commit()
+    chat_id = slot.telegram_id
+    start = slot.start_time.strftime("%d-%m-%Y %H:%M")
+    end = slot.end_time.strftime("%H:%M")
+    date_str = f"{start} - {end}"
 
-        await callback.message.edit_text(
-            f"Вы отменили занятие на {date_str}\n На него все ещё могут записаться другие пользователи!",
-            reply_markup=get_ok_to_menu_keyboard(),
-        )
-        print(chat_id)
-        await bot.send_message(
-            chat_id=chat_id,
-            text=f"Администратор отменил ваще занятие на {date_str}",
-            reply_markup=get_ok_to_menu_keyboard(),
-        )
-
-    finally:
-        db.close()
+    await callback.message.edit_text(
+        f"Вы отменили занятие на {date_str}\n На него все ещё могут записаться другие пользователи!",
+        reply_markup=get_ok_to_menu_keyboard(),
+    )
+    notifier.send_after_commit(
+        db,
+        chat_id=chat_id,
+        text=f"Администратор отменил ваще занятие на {date_str}",
+        reply_markup=get_ok_to_menu_keyboard(),
+    )
@@ -1,16 +1,16 @@
-from aiogram import F, types
-from aiogram import Router
+from aiogram import types
 
 from config import ADMIN_ID
+from handlers.routing import PrefixRouter
 from keyboards.admin_keyboards import get_admin_keyboard
 from keyboards.user_keyboards import get_user_keyboard
 
 from aiogram.fsm.context import FSMContext
 
-common_router = Router()
+common_router = PrefixRouter()
 
 
-@common_router.callback_query(F.data == "back_to_menu")
+@common_router.callback("back_to_menu", flags={"query_budget": 3})
 async def back_to_menu_handler(callback: types.CallbackQuery, state: FSMContext):
     await callback.answer()
     await state.clear()
@@ -26,6 +26,6 @@ async def back_to_menu_handler(callback: types.CallbackQuery, state: FSMContext)
         )
 
 
-@common_router.callback_query(F.data == "ignore")
+@common_router.callback("ignore", flags={"query_budget": 0})
 async def ignore_callback(callback: types.CallbackQuery):
     await callback.answer()
@@ -0,0 +1,78 @@
+from typing import Any, Callable
+
+from aiogram import Router
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import CallbackQuery
+
+# Хендлер и фабрика CallbackData (None — callback_data сравнивается целиком)
+CallbackEntry = tuple[HandlerObject, type[CallbackData] | None]
+
+
+async def stale_button_handler(callback: CallbackQuery):
+    # Без ответа у пользователя крутится индикатор загрузки на кнопке
+    await callback.answer(
+        "Кнопка устарела. Откройте меню заново: /start", show_alert=True
+    )
+
+
+STALE_BUTTON = HandlerObject(stale_button_handler, flags={"query_budget": 0})
+
+
+class PrefixRouter(Router):
+    """Router, который ищет callback-хендлер по префиксу callback_data в словаре,
+    а не проверяет фильтры всех хендлеров по очереди"""
+
+    def __init__(self, *, name: str | None = None):
+        super().__init__(name=name)
+        # префикс -> хендлер
+        self._callbacks: dict[str, CallbackEntry] = {}
+        # Один хендлер на роутер: фильтр — поиск в словаре
+        self.callback_query.register(self._dispatch, self._match)
+
+    def callback(
+        self, key: str | type[CallbackData], flags: dict[str, Any] | None = None
+    ) -> Callable:
+        """Регистрирует хендлер на строку целиком или на префикс фабрики CallbackData.
+        flags — как у router.callback_query, middleware видят их через get_flag"""
+        if isinstance(key, str):
+            prefix, factory = key, None
+        else:
+            prefix, factory = key.__prefix__, key
+
+        def decorator(handler: Callable) -> Callable:
+            if prefix in self._callbacks:
+                raise ValueError(f"Callback {prefix!r} уже зарегистрирован")
+            self._callbacks[prefix] = (
+                HandlerObject(handler, flags=dict(flags or {})),
+                factory,
+            )
+            return handler
+
+        return decorator
+
+    def _match(self, callback: CallbackQuery) -> bool | dict[str, Any]:
+        if callback.data is None:
+            return False
+        prefix = callback.data.partition(":")[0]
+        entry = self._callbacks.get(prefix)
+        if entry is None:
+            return False
+        handler, factory = entry
+        if factory is None:
+            return prefix == callback.data and {"handler": handler}
+        try:
+            callback_data = factory.unpack(callback.data)
+        except (TypeError, ValueError):
+            # Кнопка от старой версии бота или испорченные данные: префикс
+            # наш, поэтому отвечаем сами, а не отдаём апдейт дальше
+            return {"handler": STALE_BUTTON}
+        # data["handler"] подменяется найденным хендлером: его флаги и имя
+        # видят inner middleware
+        return {"handler": handler, "callback_data": callback_data}
+
+    @staticmethod
+    async def _dispatch(
+        callback: CallbackQuery, handler: HandlerObject, **kwargs: Any
+    ) -> Any:
+        return await handler.call(callback, handler=handler, **kwargs)
@@ -0,0 +1,172 @@
+from datetime import date, datetime
+
+from aiogram import types
+from aiogram.fsm.context import FSMContext
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import ADMIN_ID
+from handlers.routing import PrefixRouter
+from handlers.states import RuleStates
+from keyboards.admin_keyboards import (
+    get_admin_keyboard,
+    get_admin_rule_keyboard,
+    get_admin_rules_keyboard,
+)
+from keyboards.callbacks import DeleteRule, RuleInfo, SkipRuleDay
+from keyboards.common_keyboards import get_back_to_menu_keyboard
+from models import AvailabilityRule
+from services.rules import (
+    add_rules,
+    delete_rule,
+    format_rule,
+    get_rules,
+    parse_rules,
+    skip_rule_day,
+)
+from services.user_cache import get_user_id
+
+rule_router = PrefixRouter()
+
+
+@rule_router.callback("rules", flags={"query_budget": 2})
+async def rules_handler(callback: types.CallbackQuery, db: AsyncSession):
+    await callback.answer()
+    admin_id = await get_user_id(db, ADMIN_ID)
+    if admin_id is None:
+        await callback.message.answer("Ошибка: администратор не найден в базе данных.")
+        return
+    rules = await get_rules(db, admin_id)
+    await callback.message.edit_text(
+        (
+            "Еженедельные слоты: из них слоты появляются в календаре сами."
+            if rules
+            else "Еженедельных слотов пока нет."
+        ),
+        reply_markup=get_admin_rules_keyboard(rules),
+    )
+
+
+@rule_router.callback("add_rule", flags={"query_budget": 2})
+async def add_rule_handler(callback: types.CallbackQuery, state: FSMContext):
+    await callback.answer()
+    await callback.message.edit_text(
+        "Введите еженедельные слоты, по одному на строку, например:\n"
+        "Пн 12:00 - 13:00\n"
+        "Ср 18:00 - 19:00 до 31-05-2027\n"
+        "Пт 10:00 - 11:00 с 01-11-2026",
+        reply_markup=get_back_to_menu_keyboard(),
+    )
+    await state.set_state(RuleStates.waiting_for_rules)
+
+
+@rule_router.message(RuleStates.waiting_for_rules, flags={"query_budget": 5})
+async def process_rules_input(
+    message: types.Message, state: FSMContext, db: AsyncSession
+):
+    rules, invalid = parse_rules(message.text or "", date.today())
+    if not rules:
+        await message.answer(
+            "Не удалось разобрать ни одной строки. Формат: Пн 12:00 - 13:00 "
+            "(можно добавить «с ДД-ММ-ГГГГ» и «до ДД-ММ-ГГГГ»).",
+            reply_markup=get_back_to_menu_keyboard(),
+        )
+        # Состояние остается активным для повторного ввода
+        return
+
+    admin_id = await get_user_id(db, ADMIN_ID)
+    if admin_id is None:
+        await message.answer("Ошибка: администратор не найден в базе данных.")
+        return
+    created = await add_rules(db, admin_id, rules)
+    # Правила фиксируем до очистки FSM: хранилище пишет своей транзакцией
+    await db.commit()
+
+    lines = ["Еженедельные слоты добавлены ✅"]
+    lines += [format_rule(rule) for rule in created]
+    if invalid:
+        lines.append("\n❌ Не распознаны:")
+        lines += invalid
+    await message.answer("\n".join(lines), reply_markup=get_admin_keyboard())
+    await state.clear()
+
+
+@rule_router.callback(RuleInfo, flags={"query_budget": 1})
+async def rule_info_handler(
+    callback: types.CallbackQuery, callback_data: RuleInfo, db: AsyncSession
+):
+    await callback.answer()
+    rule = await db.get(AvailabilityRule, callback_data.rule_id)
+    if rule is None:
+        await callback.message.answer("Правило не найдено.")
+        return
+    await callback.message.edit_text(
+        f"Еженедельный слот: {format_rule(rule)}\n"
+        f"Действует с {rule.valid_from:%d-%m-%Y}",
+        reply_markup=get_admin_rule_keyboard(rule.id),
+    )
+
+
+@rule_router.callback(SkipRuleDay, flags={"query_budget": 4})
+async def skip_rule_day_handler(
+    callback: types.CallbackQuery, callback_data: SkipRuleDay, state: FSMContext
+):
+    await callback.answer()
+    await state.update_data(rule_id=callback_data.rule_id)
+    await callback.message.edit_text(
+        "Введите дату, на которую слот не нужен, в формате ДД-ММ-ГГГГ:",
+        reply_markup=get_back_to_menu_keyboard(),
+    )
+    await state.set_state(RuleStates.waiting_for_skip_date)
+
+
+@rule_router.message(RuleStates.waiting_for_skip_date, flags={"query_budget": 8})
+async def process_skip_date_input(
+    message: types.Message, state: FSMContext, db: AsyncSession
+):
+    try:
+        day = datetime.strptime((message.text or "").strip(), "%d-%m-%Y").date()
+    except ValueError:
+        await message.answer(
+            "Неверный формат даты. Пожалуйста, введите дату как ДД-ММ-ГГГГ:",
+            reply_markup=get_back_to_menu_keyboard(),
+        )
+        # Состояние остается активным для повторного ввода
+        return
+
+    data = await state.get_data()
+    admin_id = await get_user_id(db, ADMIN_ID)
+    if admin_id is None:
+        await message.answer("Ошибка: администратор не найден в базе данных.")
+        return
+    if not await skip_rule_day(db, admin_id, data["rule_id"], day):
+        await message.answer("Правило не найдено.", reply_markup=get_admin_keyboard())
+        await state.clear()
+        return
+    await db.commit()
+
+    await message.answer(
+        f"{day:%d-%m-%Y} этот слот не появится ✅\n"
+        "Если на него уже записались, запись остаётся — отмените её в расписании.",
+        reply_markup=get_admin_keyboard(),
+    )
+    await state.clear()
+
+
+@rule_router.callback(DeleteRule, flags={"query_budget": 8})
+async def delete_rule_handler(
+    callback: types.CallbackQuery, callback_data: DeleteRule, db: AsyncSession
+):
+    await callback.answer()
+    admin_id = await get_user_id(db, ADMIN_ID)
+    if admin_id is None:
+        await callback.message.answer("Ошибка: администратор не найден в базе данных.")
+        return
+    if not await delete_rule(db, admin_id, callback_data.rule_id):
+        await callback.message.answer("Правило не найдено.")
+        return
+    rules = await get_rules(db, admin_id)
+    await callback.message.edit_text(
+        "Правило удалено ✅ Свободные будущие слоты из него тоже удалены, "
+        "записи учеников остались.",
+        reply_markup=get_admin_rules_keyboard(rules),
+    )
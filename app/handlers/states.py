@@ -3,3 +3,8 @@ from aiogram.fsm.state import State, StatesGroup
 
 class ScheduleStates(StatesGroup):
     waiting_for_time = State()
+
+
+class RuleStates(StatesGroup):
+    waiting_for_rules = State()
+    waiting_for_skip_date = State()
@@ -1,284 +1,308 @@
-from aiogram import Router
+from datetime import date, datetime, timedelta
 
-from datetime import datetime
-
-from aiogram import F, types
-from sqlalchemy import func
+from aiogram import types
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 
 from config import ADMIN_ID
-from database import get_db
+from handlers.routing import PrefixRouter
 from keyboards.admin_keyboards import get_admin_accept_or_reject_slot_keyboard
+from keyboards.callbacks import (
+    CancelLesson,
+    LessonInfo,
+    SelectSlot,
+    SelectSlotDate,
+    ViewCalendar,
+)
 from keyboards.common_keyboards import (
     get_back_to_menu_keyboard,
     get_ok_to_menu_keyboard,
 )
-from models import TimeSlot, User
-from bot_instance import bot
+from models import TimeSlot
+from services.notifier import notifier
+from services.reminders import reminders
+from services.availability import availability, slot_freed, slot_taken
+from services.rules import materialize_month
+from services.slots import cancel_lesson, get_lesson_history, request_slot
+from services.user_cache import get_user_id
 
 
 from keyboards.user_keyboards import (
     get_all_user_lesson_keyboard,
     get_back_to_user_signup_keyboard,
+    get_lesson_history_keyboard,
     get_slots_time_user_keyboard,
     get_user_calendar_keyboard,
     get_user_lesson_info_keyboard,
 )
 
-user_router = Router()
+user_router = PrefixRouter()
+
+# Сколько последних прошедших занятий показывать ученику
+LESSON_HISTORY_SIZE = 20
 
 
-@user_router.callback_query(F.data == "sign_up")
-async def add_schedule_handler(callback: types.CallbackQuery):
+# Промах кэша календаря: слоты правил на месяц и соседние, свободные дни
+@user_router.callback("sign_up", flags={"query_budget": 16})
+async def add_schedule_handler(callback: types.CallbackQuery, db: AsyncSession):
     await callback.answer()
 
     await callback.message.edit_text(
         "Выбери свободный день:",
-        reply_markup=get_user_calendar_keyboard(),
+        reply_markup=await get_user_calendar_keyboard(db),
     )
 
 
-@user_router.callback_query(F.data.startswith("view_calendar:"))
-async def process_calendar_navigation(callback: types.CallbackQuery):
+@user_router.callback(ViewCalendar, flags={"query_budget": 16})
+async def process_calendar_navigation(
+    callback: types.CallbackQuery, callback_data: ViewCalendar, db: AsyncSession
+):
     await callback.answer()
 
-    _, date_str = callback.data.split(":")
-    year, month = map(int, date_str.split("-"))
-
     await callback.message.edit_text(
         "Выбери свободный день:",
-        reply_markup=get_user_calendar_keyboard(year, month),
+        reply_markup=await get_user_calendar_keyboard(
+            db, callback_data.year, callback_data.month
+        ),
     )
 
 
-@user_router.callback_query(F.data.startswith("select_slot_date:"))
-async def select_slot_date_handler(callback: types.CallbackQuery):
+@user_router.callback(SelectSlotDate, flags={"query_budget": 6})
+async def select_slot_date_handler(
+    callback: types.CallbackQuery, callback_data: SelectSlotDate, db: AsyncSession
+):
     await callback.answer()
 
-    date_str = callback.data.split(":")[1]
-    selected_date = datetime.strptime(date_str, "%Y-%m-%d").date()
+    selected_date = datetime.strptime(callback_data.day, "%Y-%m-%d")
 
-    db = next(get_db())
-    try:
+    admin_id = await get_user_id(db, ADMIN_ID)
 
-        admin = db.query(User).filter(User.telegram_id == ADMIN_ID).first()
+    if admin_id is None:
+        await callback.message.answer("Администратор не найден.")
+        return
 
-        if not admin:
-            await callback.message.answer("Администратор не найден.")
-            return
+    # Слоты из еженедельных правил на этот месяц могли ещё не создаваться
+    await materialize_month(
+        db, admin_id, selected_date.year, selected_date.month, date.today()
+    )
 
-        # Достаем все слоты на выбранную дату у этого админа
-        slots = (
-            db.query(TimeSlot)
-            .filter(
-                func.date(TimeSlot.start_time) == selected_date,
-                TimeSlot.admin_id == admin.id,
+    # Достаем все слоты на выбранную дату у этого админа
+    slots = (
+        await db.scalars(
+            select(TimeSlot)
+            .where(
+                # Диапазон вместо date(start_time), чтобы работал индекс
+                TimeSlot.start_time >= selected_date,
+                TimeSlot.start_time < selected_date + timedelta(days=1),
+                TimeSlot.admin_id == admin_id,
                 TimeSlot.is_booked == False,  # Только свободные слоты
+                TimeSlot.student_id == None,  # и без заявок в ожидании
             )
             .order_by(TimeSlot.start_time)
-            .all()
         )
+    ).all()
+    # Календарь строится из индекса процесса, а здесь ответ базы
+    availability.correct_day(admin_id, selected_date.date(), len(slots))
 
-        if not slots:
-            await callback.message.answer("На эту дату нет свободных слотов.")
-            return
+    if not slots:
+        await callback.message.answer("На эту дату нет свободных слотов.")
+        return
 
-        # Генерируем клавиатуру времени
-        keyboard = get_slots_time_user_keyboard(slots)
+    # Генерируем клавиатуру времени
+    keyboard = get_slots_time_user_keyboard(slots)
 
-        await callback.message.edit_text(
-            "Выбери время:",
-            reply_markup=keyboard,
-        )
-    finally:
-        db.close()
+    await callback.message.edit_text(
+        "Выбери время:",
+        reply_markup=keyboard,
+    )
 
 
-@user_router.callback_query(F.data.startswith("select_slot:"))
-async def select_slot_handler(callback: types.CallbackQuery):
+@user_router.callback(SelectSlot, flags={"query_budget": 2})
+async def select_slot_handler(
+    callback: types.CallbackQuery, callback_data: SelectSlot, db: AsyncSession
+):
     await callback.answer()
 
-    # Извлекаем ID выбранного слота
-    slot_id = int(callback.data.split(":")[1])
+    # ID выбранного слота
+    slot_id = callback_data.slot_id
 
-    db = next(get_db())
-    try:
-        # Ищем слот по ID
-        slot = db.query(TimeSlot).filter(TimeSlot.id == slot_id).first()
+    # Ищем пользователя, который нажал на слот
+    student_id = await get_user_id(db, callback.from_user.id)
 
-        if not slot:
-            await callback.message.answer("Ошибка: слот не найден.")
-            return
-
-        # Проверяем, если слот уже забронирован
-        if slot.is_booked:
-            await callback.message.answer("Этот слот уже забронирован.")
-            return
-
-        # Ищем пользователя, который нажал на слот
-        student = (
-            db.query(User).filter(User.telegram_id == callback.from_user.id).first()
-        )
+    if student_id is None:
+        await callback.message.answer("Ошибка: пользователь не найден в базе данных.")
+        return
 
-        if not student:
-            await callback.message.answer(
-                "Ошибка: пользователь не найден в базе данных."
-            )
-            return
+    # Записываем пользователя в поле student_id, только если слот ещё свободен.
+    # Подтверждение админа нужно отдельно (is_booked остаётся False)
+    slot = await request_slot(db, slot_id, student_id)
 
-        # Записываем пользователя в поле student_id
-        slot.student_id = student.id
-        slot.is_booked = False  # Нужно подтвреждение
-        db.commit()
-        await callback.message.edit_text(
-            f"✅ Ваша заявка на слот {slot.start_time.strftime('%d-%m-%Y %H:%M')} - {slot.end_time.strftime('%H:%M')} отправлена.\n"
-            "Ожидайте подтверждения от администратора. Вы получите уведомление, когда заявка будет обработана.",
-            reply_markup=get_ok_to_menu_keyboard(),
-        )
-        user_link = f"tg://openmessage?user_id={1387661016}"
-        await bot.send_message(
-            chat_id=ADMIN_ID,
-            text=f"Новая заявка на слот:\n"
-            f"Дата: {slot.start_time.strftime('%d-%m-%Y %H:%M')}\n"
-            f"👤 Студент: @{student.username}\n",
-            reply_markup=get_admin_accept_or_reject_slot_keyboard(slot_id),
-        )
-        # # Отправляем подтверждение
-        # await callback.message.edit_text(
-        #     f"Вы успешно записались на слот {slot.start_time.strftime('%d-%m-%Y %H:%M')} - {slot.end_time.strftime('%H:%M')}."
-        # )
+    if not slot:
+        await callback.message.answer("Этот слот уже забронирован или удалён.")
+        return
 
-    finally:
-        db.close()
+    slot_taken(db, slot)
+    await callback.message.edit_text(
+        f"✅ Ваша заявка на слот {slot.start_time.strftime('%d-%m-%Y %H:%M')} - {slot.end_time.strftime('%H:%M')} отправлена.\n"
+        "Ожидайте подтверждения от администратора. Вы получите уведомление, когда заявка будет обработана.",
+        reply_markup=get_ok_to_menu_keyboard(),
+    )
+    user_link = f"tg://openmessage?user_id={1387661016}"
+    notifier.send_after_commit(
+        db,
+        chat_id=ADMIN_ID,
+        text=f"Новая заявка на слот:\n"
+        f"Дата: {slot.start_time.strftime('%d-%m-%Y %H:%M')}\n"
+        f"👤 Студент: @{callback.from_user.username}\n",
+        reply_markup=get_admin_accept_or_reject_slot_keyboard(slot_id),
+    )
+    # # Отправляем подтверждение
+    # await callback.message.edit_text(
+    #     f"Вы успешно записались на слот {slot.start_time.strftime('%d-%m-%Y %H:%M')} - {slot.end_time.strftime('%H:%M')}."
+    # )
 
     # Возвращаемся к меню
     # await callback.message.edit_reply_markup(reply_markup=get_user_calendar_keyboard())
 
 
-@user_router.callback_query(F.data == "my_lessons")
-async def my_lessons_handler(callback: types.CallbackQuery):
+@user_router.callback("my_lessons", flags={"query_budget": 2})
+async def my_lessons_handler(callback: types.CallbackQuery, db: AsyncSession):
     await callback.answer()
 
-    db = next(get_db())
-    try:
-        # Ищем пользователя по telegram_id
-        user = db.query(User).filter(User.telegram_id == callback.from_user.id).first()
+    # Ищем пользователя по telegram_id
+    user_id = await get_user_id(db, callback.from_user.id)
 
-        if not user:
-            await callback.message.answer(
-                "Ошибка: пользователь не найден в базе данных."
-            )
-            return
+    if user_id is None:
+        await callback.message.answer("Ошибка: пользователь не найден в базе данных.")
+        return
 
-        # Получаем все занятия пользователя
-        lessons = (
-            db.query(TimeSlot)
-            .filter(TimeSlot.student_id == user.id)
-            .filter(TimeSlot.is_booked == True)
+    # Получаем текущие и будущие занятия, прошедшие — в истории
+    lessons = (
+        await db.scalars(
+            select(TimeSlot)
+            .where(TimeSlot.student_id == user_id)
+            .where(TimeSlot.is_booked == True)
+            .where(TimeSlot.end_time >= datetime.now())
             .order_by(TimeSlot.start_time)
-            .all()
         )
+    ).all()
 
-        if not lessons:
-            await callback.message.edit_text(
-                "У вас пока нет записей на занятия 📚",
-                reply_markup=get_back_to_user_signup_keyboard(),
-            )
-            return
-
-        # Строим клавиатуру занятий
-        keyboard = get_all_user_lesson_keyboard(lessons)
+    if not lessons:
+        await callback.message.edit_text(
+            "У вас пока нет записей на занятия 📚",
+            reply_markup=get_back_to_user_signup_keyboard(),
+        )
+        return
 
-        await callback.message.edit_text("Ваши занятия:", reply_markup=keyboard)
+    # Строим клавиатуру занятий
+    keyboard = get_all_user_lesson_keyboard(lessons)
 
-    finally:
-        db.close()
+    await callback.message.edit_text("Ваши занятия:", reply_markup=keyboard)
 
 
-@user_router.callback_query(F.data.startswith("lesson_info:"))
-async def lesson_info_handler(callback: types.CallbackQuery):
+@user_router.callback("lesson_history", flags={"query_budget": 2})
+async def lesson_history_handler(callback: types.CallbackQuery, db: AsyncSession):
     await callback.answer()
 
-    lesson_id = int(callback.data.split(":")[1])
+    user_id = await get_user_id(db, callback.from_user.id)
+    lessons = (
+        await get_lesson_history(db, user_id, LESSON_HISTORY_SIZE) if user_id else []
+    )
 
-    db = next(get_db())
-    try:
-        lesson = (
-            db.query(TimeSlot)
-            .options(joinedload(TimeSlot.admin))
-            .filter(TimeSlot.id == lesson_id)
-            .first()
+    if not lessons:
+        await callback.message.edit_text(
+            "Прошедших занятий пока нет.",
+            reply_markup=get_lesson_history_keyboard(),
         )
+        return
+
+    lines = ["Прошедшие занятия:"]
+    lines += [
+        f"{lesson.start_time.strftime('%d-%m-%Y %H:%M')} - "
+        f"{lesson.end_time.strftime('%H:%M')}"
+        for lesson in lessons
+    ]
+    await callback.message.edit_text(
+        "\n".join(lines), reply_markup=get_lesson_history_keyboard()
+    )
 
-        if not lesson:
-            await callback.message.edit_text(
-                "Занятие не найдено.", reply_markup=get_back_to_menu_keyboard()
-            )
-            return
 
-        start_time = lesson.start_time.strftime("%d-%m-%Y %H:%M")
-        end_time = lesson.end_time.strftime("%H:%M")
-        subject = lesson.subject if lesson.subject else "Не указана"
-        teacher_name = lesson.admin.first_name if lesson.admin else "Неизвестно"
+@user_router.callback(LessonInfo, flags={"query_budget": 1})
+async def lesson_info_handler(
+    callback: types.CallbackQuery, callback_data: LessonInfo, db: AsyncSession
+):
+    await callback.answer()
+
+    lesson_id = callback_data.lesson_id
 
-        text = (
-            # f"📚 <b>Тема:</b> {subject}\n"
-            # f"👨‍🏫 <b>Преподаватель:</b> {teacher_name}\n"
-            f"🗓 <b>Дата:</b> {start_time} - {end_time}\n"
-        )
+    lesson = await db.scalar(
+        select(TimeSlot)
+        .options(joinedload(TimeSlot.admin))
+        .where(TimeSlot.id == lesson_id)
+    )
 
+    if not lesson:
         await callback.message.edit_text(
-            text,
-            reply_markup=get_user_lesson_info_keyboard(lesson.id),
-            parse_mode="HTML",
+            "Занятие не найдено.", reply_markup=get_back_to_menu_keyboard()
         )
+        return
+
+    start_time = lesson.start_time.strftime("%d-%m-%Y %H:%M")
+    end_time = lesson.end_time.strftime("%H:%M")
+    subject = lesson.subject if lesson.subject else "Не указана"
+    teacher_name = lesson.admin.first_name if lesson.admin else "Неизвестно"
+
+    text = (
+        # f"📚 <b>Тема:</b> {subject}\n"
+        # f"👨‍🏫 <b>Преподаватель:</b> {teacher_name}\n"
+        f"🗓 <b>Дата:</b> {start_time} - {end_time}\n"
+    )
 
-    finally:
-        db.close()
+    await callback.message.edit_text(
+        text,
+        reply_markup=get_user_lesson_info_keyboard(lesson.id),
+        parse_mode="HTML",
+    )
 
 
-@user_router.callback_query(F.data.startswith("cancel_lesson:"))
-async def cancel_lesson_handler(callback: types.CallbackQuery):
+@user_router.callback(CancelLesson, flags={"query_budget": 3})
+async def cancel_lesson_handler(
+    callback: types.CallbackQuery, callback_data: CancelLesson, db: AsyncSession
+):
     await callback.answer()
 
-    lesson_id = int(callback.data.split(":")[1])
-    db = next(get_db())
-
-    try:
-        lesson = db.query(TimeSlot).filter(TimeSlot.id == lesson_id).first()
-
-        if not lesson:
-            await callback.message.answer("Занятие не найдено.")
-            return
-        user = db.query(User).filter(User.telegram_id == callback.from_user.id).first()
-        # Проверяем, что этот юзер забронировал
-        if lesson.student_id != user.id:
-            await callback.message.answer("Вы не записаны на это занятие.")
-            return
-        start = lesson.start_time.strftime("%d-%m-%Y %H:%M")
-        end = lesson.end_time.strftime("%H:%M")
-        date_str = f"{start} - {end}"
-
-        # Отменяем бронь
-        lesson.is_booked = False
-        lesson.student_id = None
-        db.commit()
+    lesson_id = callback_data.lesson_id
+    user_id = await get_user_id(db, callback.from_user.id)
 
-        await callback.message.edit_text(
-            "Вы успешно отменили запись ✅", reply_markup=get_ok_to_menu_keyboard()
-        )
+    # Отменяем бронь, только если этот юзер её и сделал
+    lesson = await cancel_lesson(db, lesson_id, user_id) if user_id else None
 
-        await bot.send_message(
-            chat_id=ADMIN_ID,
-            text=f"@{user.username} отменил запись на {date_str}",
-        )
+    if not lesson:
+        await callback.message.answer("Вы не записаны на это занятие.")
+        return
+
+    slot_freed(db, lesson)
+    reminders.cancel_after_commit(db, lesson.id)
+
+    start = lesson.start_time.strftime("%d-%m-%Y %H:%M")
+    end = lesson.end_time.strftime("%H:%M")
+    date_str = f"{start} - {end}"
+
+    await callback.message.edit_text(
+        "Вы успешно отменили запись ✅", reply_markup=get_ok_to_menu_keyboard()
+    )
+
+    notifier.send_after_commit(
+        db,
+        chat_id=ADMIN_ID,
+        text=f"@{callback.from_user.username} отменил запись на {date_str}",
+    )
 
-        # await my_lessons_handler(callback)  # Перезапускаем список занятий
-    finally:
-        db.close()
+    # await my_lessons_handler(callback)  # Перезапускаем список занятий
 
 
-@user_router.callback_query(F.data == "about_us")
+@user_router.callback("about_us", flags={"query_budget": 0})
 async def about_us_handler(callback: types.CallbackQuery):
     await callback.answer()
     await callback.message.answer("Мы - команда, которая делает обучение удобным!")
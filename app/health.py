@@ -0,0 +1,33 @@
+from aiohttp import web
+
+# /health — процесс жив; /ready — стартовал полностью и принимает апдейты.
+# Балансировщик и оркестратор шлют трафик только на готовый процесс.
+
+
+class Readiness:
+    def __init__(self):
+        self.ready = False
+
+    async def mark_ready(self):
+        self.ready = True
+
+    async def mark_not_ready(self):
+        self.ready = False
+
+
+readiness = Readiness()
+
+
+async def health_handler(request: web.Request) -> web.Response:
+    return web.json_response({"status": "ok"})
+
+
+async def ready_handler(request: web.Request) -> web.Response:
+    if not readiness.ready:
+        return web.json_response({"status": "starting"}, status=503)
+    return web.json_response({"status": "ready"})
+
+
+def add_health_routes(app: web.Application):
+    app.router.add_get("/health", health_handler)
+    app.router.add_get("/ready", ready_handler)
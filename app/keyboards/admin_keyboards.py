@@ -1,17 +1,45 @@
-import calendar
 from datetime import date, datetime, timedelta
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-
-def get_admin_keyboard() -> InlineKeyboardMarkup:
+from keyboards.calendar_keyboards import cached_button, render_calendar
+from keyboards.callbacks import (
+    ApproveSlot,
+    CancelBookedSlot,
+    ChangeMonth,
+    DeleteRule,
+    DeleteSlot,
+    RejectSlot,
+    RuleInfo,
+    SchedulePage,
+    SelectDate,
+    SelectedSlot,
+    SkipRuleDay,
+    callback_format,
+)
+from services.rules import format_rule
+
+# День в формате, в котором админ потом вводит время (ДД-ММ-ГГГГ)
+SELECT_DATE_FORMAT = callback_format(SelectDate, "date:%d-%m-%Y")
+
+
+def _build_admin_keyboard() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text="📅 Добавить расписание", callback_data="add_schedule")
     builder.button(text="🗓️ Посмотреть расписание", callback_data="view_schedule")
+    builder.button(text="🔁 Еженедельные слоты", callback_data="rules")
     builder.adjust(1)
     return builder.as_markup()
 
 
+# Статичное меню собирается один раз при импорте
+ADMIN_KEYBOARD = _build_admin_keyboard()
+
+
+def get_admin_keyboard() -> InlineKeyboardMarkup:
+    return ADMIN_KEYBOARD
+
+
 def get_admin_calendar_keyboard(
     year: int = None, month: int = None
 ) -> InlineKeyboardMarkup:
@@ -35,43 +63,6 @@ def get_admin_calendar_keyboard(
         year = max_date.year
         month = max_date.month
 
-    # Генерируем календарь
-    month_cal = calendar.monthcalendar(year, month)
-    month_name = calendar.month_name[month]
-    header = f"{month_name} {year}"
-
-    keyboard = []
-    keyboard.append([InlineKeyboardButton(text=header, callback_data="ignore")])
-
-    # Дни недели
-    week_days = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
-    keyboard.append(
-        [InlineKeyboardButton(text=day, callback_data="ignore") for day in week_days]
-    )
-
-    # Кнопки дней месяца
-    for week in month_cal:
-        week_buttons = []
-        for day in week:
-            if day == 0:
-                week_buttons.append(
-                    InlineKeyboardButton(text=" ", callback_data="ignore")
-                )
-            else:
-                current_date = date(year, month, day)
-                if min_date <= current_date <= max_date:
-                    date_str = f"{day:02d}-{month:02d}-{year}"
-                    week_buttons.append(
-                        InlineKeyboardButton(
-                            text=str(day), callback_data=f"select_date:{date_str}"
-                        )
-                    )
-                else:
-                    week_buttons.append(
-                        InlineKeyboardButton(text=" ", callback_data="ignore")
-                    )
-        keyboard.append(week_buttons)
-
     # Кнопки навигации (только вперёд, если не превышаем год)
     nav_buttons = []
 
@@ -81,8 +72,8 @@ def get_admin_calendar_keyboard(
         prev_year = year if month > 1 else year - 1
         if date(prev_year, prev_month, 1) >= min_date.replace(day=1):
             nav_buttons.append(
-                InlineKeyboardButton(
-                    text="◀️", callback_data=f"change_month:{prev_year}-{prev_month}"
+                cached_button(
+                    "◀️", ChangeMonth(year=prev_year, month=prev_month).pack()
                 )
             )
 
@@ -92,30 +83,63 @@ def get_admin_calendar_keyboard(
         next_year = year if month < 12 else year + 1
         if date(next_year, next_month, 1) <= max_date.replace(day=1):
             nav_buttons.append(
-                InlineKeyboardButton(
-                    text="▶️", callback_data=f"change_month:{next_year}-{next_month}"
+                cached_button(
+                    "▶️", ChangeMonth(year=next_year, month=next_month).pack()
                 )
             )
 
-    if nav_buttons:
-        keyboard.append(nav_buttons)
-
-    # Кнопка возврата
-    keyboard.append(
-        [InlineKeyboardButton(text="↩️ Назад", callback_data="back_to_menu")]
+    # Сетка месяца берётся из кэша, накладываем только диапазон дат
+    return render_calendar(
+        year,
+        month,
+        lambda current_date: min_date <= current_date <= max_date,
+        SELECT_DATE_FORMAT,
+        nav_buttons,
     )
 
-    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+SCHEDULE_FILTER_NAMES = {
+    "all": "Все",
+    "free": "Свободные",
+    "pending": "Ожидают",
+    "booked": "Забронированы",
+    "history": "📜 История",
+}
 
 
-def get_admin_shedule_slots_keyboard(slots):
+def get_schedule_page_callback(status: str, direction: str, slot=None) -> str:
+    # Ключ страницы (start_time, id) для callback_data
+    if slot is None:
+        return SchedulePage(status=status, direction=direction).pack()
+    return SchedulePage(
+        status=status,
+        direction=direction,
+        start=slot.start_time.strftime("%Y%m%d%H%M%S"),
+        slot_id=slot.id,
+    ).pack()
+
+
+def get_admin_shedule_slots_keyboard(
+    slots, status: str = "all", has_prev: bool = False, has_next: bool = False
+):
     # Создаем клавиатуру с кнопками для каждого слота
     builder = InlineKeyboardBuilder()
 
+    # Фильтры по статусу, выбранный отмечен точкой
+    filter_buttons = [
+        InlineKeyboardButton(
+            text=f"• {name}" if key == status else name,
+            callback_data=get_schedule_page_callback(key, "next"),
+        )
+        for key, name in SCHEDULE_FILTER_NAMES.items()
+    ]
+    builder.row(*filter_buttons[:3])
+    builder.row(*filter_buttons[3:])
+
     for slot in slots:
         start = slot.start_time.strftime("%d-%m-%Y %H:%M")
         end = slot.end_time.strftime("%H:%M")
-        if slot.student:
+        if slot.student_id:
             if slot.is_booked:
                 student_info = f"Забронировано"
             else:
@@ -125,21 +149,48 @@ def get_admin_shedule_slots_keyboard(slots):
             student_info = "Свободно"
 
         button_text = f"{start} - {end} | {student_info}"
-        builder.button(
-            text=button_text,
-            callback_data=f"selected_slot:{slot.id}",  # Передаем id слота
+        builder.row(
+            InlineKeyboardButton(
+                text=button_text,
+                # Архивные слоты только для просмотра
+                callback_data=(
+                    "ignore"
+                    if status == "history"
+                    else SelectedSlot(slot_id=slot.id).pack()
+                ),
+            )
         )
 
+    # Листание страниц
+    nav_buttons = []
+    if has_prev:
+        nav_buttons.append(
+            InlineKeyboardButton(
+                text="◀️",
+                callback_data=get_schedule_page_callback(status, "prev", slots[0]),
+            )
+        )
+    if has_next:
+        nav_buttons.append(
+            InlineKeyboardButton(
+                text="▶️",
+                callback_data=get_schedule_page_callback(status, "next", slots[-1]),
+            )
+        )
+    if nav_buttons:
+        builder.row(*nav_buttons)
+
     # Кнопка "Назад"
-    builder.button(text="↩️ Назад", callback_data="back_to_menu")
+    builder.row(InlineKeyboardButton(text="↩️ Назад", callback_data="back_to_menu"))
 
-    builder.adjust(1)
     return builder.as_markup()
 
 
 def get_admin_delete_selected_slot_keyboard(slot_id):
     builder = InlineKeyboardBuilder()
-    builder.button(text="Удалить слот", callback_data=f"delete_slot:{slot_id}")
+    builder.button(
+        text="Удалить слот", callback_data=DeleteSlot(slot_id=slot_id).pack()
+    )
     builder.button(text="↩️ Назад", callback_data="view_schedule")
     builder.adjust(1)
     return builder.as_markup()
@@ -148,7 +199,7 @@ def get_admin_delete_selected_slot_keyboard(slot_id):
 def get_admin_cancel_selected_slot_keyboard(slot_id):
     builder = InlineKeyboardBuilder()
     builder.button(
-        text="Отменить урок", callback_data=f"cansel_user_selected_slot:{slot_id}"
+        text="Отменить урок", callback_data=CancelBookedSlot(slot_id=slot_id).pack()
     )
     builder.button(text="↩️ Назад", callback_data="view_schedule")
     builder.adjust(1)
@@ -157,7 +208,32 @@ def get_admin_cancel_selected_slot_keyboard(slot_id):
 
 def get_admin_accept_or_reject_slot_keyboard(slot_id):
     builder = InlineKeyboardBuilder()
-    builder.button(text="Принять", callback_data=f"is_booked_slot:{slot_id}")
-    builder.button(text="Отклонить", callback_data=f"cancel_booked_slot:{slot_id}")
+    builder.button(text="Принять", callback_data=ApproveSlot(slot_id=slot_id).pack())
+    builder.button(text="Отклонить", callback_data=RejectSlot(slot_id=slot_id).pack())
+    builder.adjust(1)
+    return builder.as_markup()
+
+
+def get_admin_rules_keyboard(rules):
+    builder = InlineKeyboardBuilder()
+    for rule in rules:
+        builder.button(
+            text=format_rule(rule), callback_data=RuleInfo(rule_id=rule.id).pack()
+        )
+    builder.button(text="➕ Добавить", callback_data="add_rule")
+    builder.button(text="↩️ Назад", callback_data="back_to_menu")
+    builder.adjust(1)
+    return builder.as_markup()
+
+
+def get_admin_rule_keyboard(rule_id):
+    builder = InlineKeyboardBuilder()
+    builder.button(
+        text="Пропустить дату", callback_data=SkipRuleDay(rule_id=rule_id).pack()
+    )
+    builder.button(
+        text="Удалить правило", callback_data=DeleteRule(rule_id=rule_id).pack()
+    )
+    builder.button(text="↩️ Назад", callback_data="rules")
     builder.adjust(1)
     return builder.as_markup()
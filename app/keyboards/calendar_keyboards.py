@@ -0,0 +1,77 @@
+import calendar
+from datetime import date
+from functools import lru_cache
+from typing import Callable
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+# Общая отрисовка календаря для админа и пользователя.
+# Сетка месяца и кнопки дней строятся один раз на (год, месяц),
+# на каждый запрос накладываются только доступные дни и навигация.
+
+WEEK_DAYS = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+
+BLANK_BUTTON = InlineKeyboardButton(text=" ", callback_data="ignore")
+WEEK_DAYS_ROW = [
+    InlineKeyboardButton(text=day, callback_data="ignore") for day in WEEK_DAYS
+]
+BACK_TO_MENU_ROW = [InlineKeyboardButton(text="↩️ Назад", callback_data="back_to_menu")]
+
+
+@lru_cache(maxsize=4096)
+def cached_button(text: str, callback_data: str) -> InlineKeyboardButton:
+    # Кнопки не изменяются после создания, одинаковые можно переиспользовать
+    return InlineKeyboardButton(text=text, callback_data=callback_data)
+
+
+@lru_cache(maxsize=64)
+def month_skeleton(year: int, month: int):
+    """Заголовок месяца и недели с датами (None - пустая клетка)"""
+    header = [cached_button(f"{calendar.month_name[month]} {year}", "ignore")]
+    weeks = tuple(
+        tuple(date(year, month, day) if day else None for day in week)
+        for week in calendar.monthcalendar(year, month)
+    )
+    return header, weeks
+
+
+@lru_cache(maxsize=256)
+def month_day_buttons(
+    year: int, month: int, callback_format: str
+) -> dict[date, InlineKeyboardButton]:
+    """Кнопки дней месяца, callback_format получает дату как {date}"""
+    days_in_month = calendar.monthrange(year, month)[1]
+    buttons = {}
+    for day in range(1, days_in_month + 1):
+        current_date = date(year, month, day)
+        buttons[current_date] = InlineKeyboardButton(
+            text=str(day), callback_data=callback_format.format(date=current_date)
+        )
+    return buttons
+
+
+def render_calendar(
+    year: int,
+    month: int,
+    is_active: Callable[[date], bool],
+    callback_format: str,
+    nav_buttons: list[InlineKeyboardButton],
+) -> InlineKeyboardMarkup:
+    header, weeks = month_skeleton(year, month)
+    day_buttons = month_day_buttons(year, month, callback_format)
+
+    keyboard = [header, WEEK_DAYS_ROW]
+    for week in weeks:
+        keyboard.append(
+            [
+                day_buttons[day] if day is not None and is_active(day) else BLANK_BUTTON
+                for day in week
+            ]
+        )
+
+    if nav_buttons:
+        keyboard.append(nav_buttons)
+
+    keyboard.append(BACK_TO_MENU_ROW)
+
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
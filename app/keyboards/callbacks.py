@@ -0,0 +1,101 @@
+from datetime import datetime
+
+from aiogram.filters.callback_data import CallbackData
+
+# callback_data кнопок с параметрами: префикс и поля через ":". Хендлер получает
+# уже разобранный объект (callback_data), PrefixRouter находит его по префиксу.
+# Кнопки без параметров («sign_up», «my_lessons», ...) остаются строками.
+
+
+def callback_format(factory: type[CallbackData], placeholder: str) -> str:
+    # Шаблон для str.format вместо pack(): календарь собирает сотни кнопок
+    return f"{factory.__prefix__}{factory.__separator__}{{{placeholder}}}"
+
+
+class LegacyMonthMixin:
+    """Разбирает и старый формат кнопок календаря «prefix:ГГГГ-ММ»: такие
+    кнопки остались в чатах от версии без CallbackData"""
+
+    @classmethod
+    def unpack(cls, value: str):
+        prefix, _, payload = value.partition(cls.__separator__)
+        year, dash, month = payload.partition("-")
+        if prefix == cls.__prefix__ and dash and year.isdigit() and month.isdigit():
+            return cls(year=int(year), month=int(month))
+        return super().unpack(value)
+
+
+class ChangeMonth(LegacyMonthMixin, CallbackData, prefix="change_month"):
+    year: int
+    month: int
+
+
+class SelectDate(CallbackData, prefix="select_date"):
+    day: str  # ДД-ММ-ГГГГ
+
+
+class SchedulePage(CallbackData, prefix="schedule"):
+    status: str
+    direction: str  # next или prev
+    # Ключ страницы (start_time, id), пустой для первой страницы
+    start: str | None = None
+    slot_id: int | None = None
+
+    @property
+    def cursor(self) -> tuple[datetime, int] | None:
+        if not self.start:
+            return None
+        return datetime.strptime(self.start, "%Y%m%d%H%M%S"), self.slot_id
+
+
+class SelectedSlot(CallbackData, prefix="selected_slot"):
+    slot_id: int
+
+
+class DeleteSlot(CallbackData, prefix="delete_slot"):
+    slot_id: int
+
+
+class ApproveSlot(CallbackData, prefix="is_booked_slot"):
+    slot_id: int
+
+
+class RejectSlot(CallbackData, prefix="cancel_booked_slot"):
+    slot_id: int
+
+
+class CancelBookedSlot(CallbackData, prefix="cansel_user_selected_slot"):
+    slot_id: int
+
+
+class RuleInfo(CallbackData, prefix="rule"):
+    rule_id: int
+
+
+class SkipRuleDay(CallbackData, prefix="skip_rule_day"):
+    rule_id: int
+
+
+class DeleteRule(CallbackData, prefix="delete_rule"):
+    rule_id: int
+
+
+class ViewCalendar(LegacyMonthMixin, CallbackData, prefix="view_calendar"):
+    year: int
+    month: int
+
+
+class SelectSlotDate(CallbackData, prefix="select_slot_date"):
+    day: str  # ГГГГ-ММ-ДД
+
+
+class SelectSlot(CallbackData, prefix="select_slot"):
+    slot_id: int
+
+
+class LessonInfo(CallbackData, prefix="lesson_info"):
+    lesson_id: int
+
+
+class CancelLesson(CallbackData, prefix="cancel_lesson"):
+    lesson_id: int
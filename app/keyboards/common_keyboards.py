@@ -1,15 +1,19 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+# Статичные клавиатуры собираются один раз при импорте
+BACK_TO_MENU_KEYBOARD = InlineKeyboardMarkup(
+    inline_keyboard=[
+        [InlineKeyboardButton(text="↩️ Назад", callback_data="back_to_menu")]
+    ]
+)
+OK_TO_MENU_KEYBOARD = InlineKeyboardMarkup(
+    inline_keyboard=[[InlineKeyboardButton(text="OK", callback_data="back_to_menu")]]
+)
+
 
 def get_back_to_menu_keyboard():
-    keyboard = []
-    keyboard.append(
-        [InlineKeyboardButton(text="↩️ Назад", callback_data="back_to_menu")]
-    )
-    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+    return BACK_TO_MENU_KEYBOARD
 
 
 def get_ok_to_menu_keyboard():
-    keyboard = []
-    keyboard.append([InlineKeyboardButton(text="OK", callback_data="back_to_menu")])
-    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+    return OK_TO_MENU_KEYBOARD
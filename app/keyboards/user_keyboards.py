@@ -1,16 +1,28 @@
-import calendar
-from datetime import date, datetime, timedelta
+from datetime import datetime, timedelta
 
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import ADMIN_ID
-from database import get_db
-from models import TimeSlot, User
-
-
-def get_user_keyboard() -> InlineKeyboardMarkup:
+from keyboards.calendar_keyboards import cached_button, render_calendar
+from keyboards.callbacks import (
+    CancelLesson,
+    LessonInfo,
+    SelectSlot,
+    SelectSlotDate,
+    ViewCalendar,
+    callback_format,
+)
+from models import TimeSlot
+from services.availability import get_month_availability
+from services.rules import materialize_month
+from services.user_cache import get_user_id
+
+SELECT_SLOT_DATE_FORMAT = callback_format(SelectSlotDate, "date")
+
+
+def _build_user_keyboard() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text="📅 Записаться", callback_data="sign_up")
     builder.button(text="🗓️ Мои занятия", callback_data="my_lessons")
@@ -19,110 +31,61 @@ def get_user_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
-def get_user_calendar_keyboard(
-    year: int = None, month: int = None
+# Статичное меню собирается один раз при импорте
+USER_KEYBOARD = _build_user_keyboard()
+
+
+def get_user_keyboard() -> InlineKeyboardMarkup:
+    return USER_KEYBOARD
+
+
+async def get_user_calendar_keyboard(
+    db: AsyncSession, year: int = None, month: int = None
 ) -> InlineKeyboardMarkup:
-    db = next(get_db())
     now = datetime.now()
     min_date = now.date()
     max_date = (now + timedelta(days=365)).date()
-    admin = db.query(User).filter(User.telegram_id == ADMIN_ID).first()
+    admin_id = await get_user_id(db, ADMIN_ID)
 
-    if not admin:
-        db.close()
+    if admin_id is None:
         raise ValueError("Администратор с таким Telegram ID не найден.")
 
-    # Получаем все уникальные даты, на которые есть свободные слоты
-    slots_dates = (
-        db.query(func.date(TimeSlot.start_time))
-        .filter(
-            TimeSlot.start_time >= min_date,
-            TimeSlot.start_time <= max_date,
-            TimeSlot.admin_id == admin.id,
-            TimeSlot.is_booked == False,
-            TimeSlot.student_id == None,
-        )
-        .all()
-    )
-    db.close()
-
-    available_dates = set(d[0] for d in slots_dates)
-
     # Если год и месяц не переданы - берем текущие
     if year is None or month is None:
         year = now.year
         month = now.month
 
-    month_cal = calendar.monthcalendar(year, month)
-    month_name = calendar.month_name[month]
-    header = f"{month_name} {year}"
-
-    keyboard = []
-    keyboard.append([InlineKeyboardButton(text=header, callback_data="ignore")])
-
-    week_days = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
-    keyboard.append(
-        [InlineKeyboardButton(text=day, callback_data="ignore") for day in week_days]
+    # Свободные дни только этого месяца и наличие слотов в соседних
+    available_dates, has_prev, has_next = await get_month_availability(
+        db, admin_id, year, month, min_date, max_date, materialize=materialize_month
     )
 
-    for week in month_cal:
-        week_buttons = []
-        for day in week:
-            if day == 0:
-                week_buttons.append(
-                    InlineKeyboardButton(text=" ", callback_data="ignore")
-                )
-            else:
-                current_date = date(year, month, day)
-                if current_date in available_dates:
-                    week_buttons.append(
-                        InlineKeyboardButton(
-                            text=str(day),
-                            callback_data=f"select_slot_date:{current_date}",
-                        )
-                    )
-                else:
-                    week_buttons.append(
-                        InlineKeyboardButton(text=" ", callback_data="ignore")
-                    )
-        keyboard.append(week_buttons)
-
-    # Определяем наличие предыдущего и следующего месяца со слотами
-    available_months = set((d.year, d.month) for d in available_dates)
-
     prev_month = (month - 1) or 12
     prev_year = year if month != 1 else year - 1
 
     next_month = (month + 1) if month != 12 else 1
     next_year = year if month != 12 else year + 1
 
-    has_prev = (prev_year, prev_month) in available_months
-    has_next = (next_year, next_month) in available_months
-
     navigation_buttons = []
     if has_prev:
         navigation_buttons.append(
-            InlineKeyboardButton(
-                text="◀️", callback_data=f"view_calendar:{prev_year}-{prev_month}"
-            )
+            cached_button("◀️", ViewCalendar(year=prev_year, month=prev_month).pack())
         )
-    navigation_buttons.append(InlineKeyboardButton(text="📅", callback_data="ignore"))
+    navigation_buttons.append(cached_button("📅", "ignore"))
     if has_next:
         navigation_buttons.append(
-            InlineKeyboardButton(
-                text="▶️", callback_data=f"view_calendar:{next_year}-{next_month}"
-            )
+            cached_button("▶️", ViewCalendar(year=next_year, month=next_month).pack())
         )
 
-    keyboard.append(navigation_buttons)
-
-    # Кнопка назад
-    keyboard.append(
-        [InlineKeyboardButton(text="↩️ Назад", callback_data="back_to_menu")]
+    # Сетка месяца берётся из кэша, накладываем только свободные дни
+    return render_calendar(
+        year,
+        month,
+        available_dates.__contains__,
+        SELECT_SLOT_DATE_FORMAT,
+        navigation_buttons,
     )
 
-    return InlineKeyboardMarkup(inline_keyboard=keyboard)
-
 
 def get_slots_time_user_keyboard(slots: list[TimeSlot]) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
@@ -131,7 +94,8 @@ def get_slots_time_user_keyboard(slots: list[TimeSlot]) -> InlineKeyboardMarkup:
         start_time = slot.start_time.strftime("%d-%m-%Y %H:%M")
         end_time = slot.end_time.strftime("%H:%M")
         builder.button(
-            text=f"{start_time} - {end_time}", callback_data=f"select_slot:{slot.id}"
+            text=f"{start_time} - {end_time}",
+            callback_data=SelectSlot(slot_id=slot.id).pack(),
         )
 
     builder.button(text="↩️ Назад", callback_data="sign_up")
@@ -149,9 +113,12 @@ def get_all_user_lesson_keyboard(lessons):
         end_str = lesson.end_time.strftime("%H:%M")
         builder.button(
             text=f"{start_str} - {end_str}",
-            callback_data=f"lesson_info:{lesson.id}",  # Можно потом сделать обработчик подробнее по занятию
+            callback_data=LessonInfo(
+                lesson_id=lesson.id
+            ).pack(),  # Можно потом сделать обработчик подробнее по занятию
         )
 
+    builder.button(text="📜 Прошедшие занятия", callback_data="lesson_history")
     builder.button(text="↩️ Назад", callback_data="back_to_menu")
     builder.adjust(1)  # 1 кнопка в ряд
 
@@ -161,16 +128,38 @@ def get_all_user_lesson_keyboard(lessons):
 def get_user_lesson_info_keyboard(lesson_id: int):
     builder = InlineKeyboardBuilder()
     builder.button(
-        text="❌ Отменить запись", callback_data=f"cancel_lesson:{lesson_id}"
+        text="❌ Отменить запись",
+        callback_data=CancelLesson(lesson_id=lesson_id).pack(),
     )
     builder.button(text="↩️ Назад", callback_data="my_lessons")
     builder.adjust(1)
     return builder.as_markup()
 
 
-def get_back_to_user_signup_keyboard():
+def _build_back_to_user_signup_keyboard():
     builder = InlineKeyboardBuilder()
     builder.button(text="📅 Записаться на занятие", callback_data="sign_up")
+    builder.button(text="📜 Прошедшие занятия", callback_data="lesson_history")
     builder.button(text="↩️ Назад", callback_data="back_to_menu")  # если хочешь
     builder.adjust(1)
     return builder.as_markup()
+
+
+BACK_TO_USER_SIGNUP_KEYBOARD = _build_back_to_user_signup_keyboard()
+
+
+def get_back_to_user_signup_keyboard():
+    return BACK_TO_USER_SIGNUP_KEYBOARD
+
+
+def _build_lesson_history_keyboard():
+    builder = InlineKeyboardBuilder()
+    builder.button(text="↩️ Назад", callback_data="my_lessons")
+    return builder.as_markup()
+
+
+LESSON_HISTORY_KEYBOARD = _build_lesson_history_keyboard()
+
+
+def get_lesson_history_keyboard():
+    return LESSON_HISTORY_KEYBOARD
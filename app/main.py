@@ -1,76 +1,173 @@
 import asyncio
-from bot_instance import bot, dp
-from database import SessionLocal, create_tables
+import sys
+from bot_instance import dp, get_bot
+from database import SessionLocal, check_schema, get_engine, run_migrations
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from aiogram.filters import Command
-from config import ADMIN_ID
-from aiogram import types
+from config import ADMIN_ID, BOT_MODE, TOKEN, WORKERS
+from aiogram import Dispatcher, types
 
 from keyboards.admin_keyboards import get_admin_keyboard
 from keyboards.user_keyboards import get_user_keyboard
-from models import User
 
 from handlers.admin_handlers import admin_router
 from handlers.common_handlers import common_router
+from handlers.rule_handlers import rule_router
 from handlers.user_handlers import user_router
-
-
-@dp.message(Command("start"))
-async def start_handler(message: types.Message):
-    db = SessionLocal()
-
-    try:
-        # Проверяем, есть ли пользователь в базе
-        user = db.query(User).filter(User.telegram_id == message.from_user.id).first()
-
-        if not user:
-            # Если нет — создаем нового
-            new_user = User(
-                telegram_id=message.from_user.id,
-                username=message.from_user.username or "",
-                first_name=message.from_user.first_name or "",
-                last_name=message.from_user.last_name or "",
-            )
-            db.add(new_user)
-            db.commit()
-
-        # Ответ пользователю
-        if message.from_user.id == ADMIN_ID:
-            await message.answer(
-                f"Добро пожаловать, {message.from_user.username}, вы админ! Выберите действие:",
-                reply_markup=get_admin_keyboard(),
-            )
-        else:
-            await message.answer(
-                f"Добро пожаловать, {message.from_user.username}, Выберите действие:",
-                reply_markup=get_user_keyboard(),
-            )
-    finally:
-        db.close()
-
-
-@dp.message(Command("admin"))
+from health import readiness
+from metrics import BotApiTimer, metrics_server
+from middlewares.db import DbSessionMiddleware
+from middlewares.metrics import HandlerLabelMiddleware, UpdateMetricsMiddleware
+from middlewares.query_budget import QueryBudgetMiddleware
+from services.archive import archiver
+from services.notifier import notifier
+from services.profiles import profiles
+from services.reminders import reminders
+from webhook import run_webhook
+from workers import WorkerPool, serve_queue
+
+
+@dp.message(Command("start"), flags={"query_budget": 1})
+async def start_handler(message: types.Message, db: AsyncSession):
+    # Знакомый пользователь с тем же профилем не идёт в базу, новый
+    # записывается одним INSERT ... ON CONFLICT DO UPDATE
+    await profiles.ensure_user(db, message.from_user)
+
+    # Ответ пользователю
+    if message.from_user.id == ADMIN_ID:
+        await message.answer(
+            f"Добро пожаловать, {message.from_user.username}, вы админ! Выберите действие:",
+            reply_markup=get_admin_keyboard(),
+        )
+    else:
+        await message.answer(
+            f"Добро пожаловать, {message.from_user.username}, Выберите действие:",
+            reply_markup=get_user_keyboard(),
+        )
+
+
+@dp.message(Command("admin"), flags={"query_budget": 0})
 async def start_handler(message: types.Message):
     await message.answer(
         "Вы вошли как администратор:", reply_markup=get_admin_keyboard()
     )
 
 
-@dp.message(Command("user"))
+@dp.message(Command("user"), flags={"query_budget": 0})
 async def start_handler(message: types.Message):
     await message.answer("Вы вошли как пользователь:", reply_markup=get_user_keyboard())
 
 
-@dp.message(Command("id"))
+@dp.message(Command("id"), flags={"query_budget": 0})
 async def start_handler(message: types.Message):
     current_user_id = message.from_user.id
     await message.answer(f"Ваш id: {current_user_id}")
 
 
+ROUTERS = (admin_router, rule_router, common_router, user_router)
+
+
+def require_settings():
+    if not TOKEN or not ADMIN_ID:
+        raise ValueError("Задайте TOKEN и ADMIN_ID в окружении или в .env.")
+
+
+def used_update_types() -> list[str]:
+    # Типы апдейтов хендлеров без сборки приложения: раздатчику воркеров
+    # не нужны ни middleware, ни фоновые задачи
+    return sorted(
+        {
+            *dp.resolve_used_update_types(),
+            *(
+                name
+                for router in ROUTERS
+                for name in router.resolve_used_update_types()
+            ),
+        }
+    )
+
+
+def create_app(primary: bool = True) -> Dispatcher:
+    """Собирает приложение: движок базы, Bot, middleware, хендлеры и фоновые
+    задачи. До вызова импорт модулей ничего не создаёт и токена не требует"""
+    require_settings()
+    get_engine()
+    bot = get_bot()
+
+    # Один и тот же стек хендлеров в обычном режиме и в каждом воркере
+    # Метрики снаружи FSM и сессии, чтобы во время апдейта попали и
+    # чтение состояния, и коммит
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    dp.update.outer_middleware(dp.fsm)
+    dp.update.outer_middleware(DbSessionMiddleware(SessionLocal))
+    for observer in (dp.message, dp.callback_query):
+        observer.middleware(HandlerLabelMiddleware())
+        observer.middleware(QueryBudgetMiddleware())
+    bot.session.middleware(BotApiTimer())
+    dp.startup.register(metrics_server.start)
+    dp.shutdown.register(metrics_server.stop)
+    dp.startup.register(notifier.start)
+    dp.shutdown.register(notifier.stop)
+    dp.startup.register(profiles.start)
+    dp.shutdown.register(profiles.stop)
+    # Фоновые задачи, которые читают всю базу, — только в одном процессе
+    if primary:
+        dp.startup.register(reminders.load)
+        dp.startup.register(archiver.start)
+        dp.shutdown.register(archiver.stop)
+    dp.startup.register(reminders.start)
+    dp.shutdown.register(reminders.stop)
+    dp.include_routers(*ROUTERS)
+    return dp
+
+
+def run_worker(index: int, queue, workers: int):
+    # Точка входа процесса-воркера: апдейты приходят из очереди раздатчика
+    notifier.share_rate(workers)
+    metrics_server.use_worker_port(index)
+    dispatcher = create_app(primary=index == 0)
+    dispatcher.startup.register(readiness.mark_ready)
+    dispatcher.shutdown.register(readiness.mark_not_ready)
+    asyncio.run(serve_queue(dispatcher, get_bot(), queue))
+
+
+async def serve(dispatcher: Dispatcher, allowed_updates: list[str]):
+    # Готов, когда отработали все startup-хуки (у раздатчика — запущены воркеры)
+    dispatcher.startup.register(readiness.mark_ready)
+    dispatcher.shutdown.register(readiness.mark_not_ready)
+    bot = get_bot()
+    if BOT_MODE == "webhook":
+        await run_webhook(dispatcher, bot, allowed_updates)
+    else:
+        # Telegram не отдаёт getUpdates, пока установлен вебхук
+        await bot.delete_webhook()
+        await dispatcher.start_polling(bot, allowed_updates=allowed_updates)
+
+
 async def main():
-    create_tables()
-    dp.include_routers(admin_router, common_router, user_router)
-    await dp.start_polling(bot)
+    if sys.argv[1:] == ["migrate"]:
+        # Миграции — отдельный шаг деплоя, а не часть каждого старта
+        try:
+            await run_migrations()
+        finally:
+            await get_engine().dispose()
+        return
+
+    require_settings()
+    # Вместо миграций при старте — одна проверка ревизии схемы
+    await check_schema()
+    allowed_updates = used_update_types()
+
+    if WORKERS > 1:
+        # Этот процесс только получает апдейты и раздаёт их воркерам.
+        # Хендлеров у него нет, но /health и /ready он отдаёт на порту метрик
+        fetcher = WorkerPool(run_worker, WORKERS).fetcher
+        fetcher.startup.register(metrics_server.start)
+        fetcher.shutdown.register(metrics_server.stop)
+        await serve(fetcher, allowed_updates)
+    else:
+        await serve(create_app(), allowed_updates)
 
 
 if __name__ == "__main__":
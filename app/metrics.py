@@ -0,0 +1,180 @@
+import bisect
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.methods import Response, TelegramMethod
+from aiohttp import web
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import METRICS_HOST, METRICS_PORT
+from health import add_health_routes
+
+# Гистограммы в текстовом формате Prometheus. Каждый процесс считает свои
+# метрики и отдаёт их на своём порту: клиент Prometheus не нужен.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, label: str, buckets: tuple):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        # значение метки -> [счётчики по корзинам (+Inf последней), сумма]
+        self._series: dict[str, list] = {}
+
+    def observe(self, label_value: str, value: float):
+        series = self._series.get(label_value)
+        if series is None:
+            series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_value, (counts, total) in sorted(self._series.items()):
+            label = f'{self.label}="{label_value}"'
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label}}} {total}")
+            lines.append(f"{self.name}_count{{{label}}} {cumulative}")
+        return lines
+
+
+HANDLER_SECONDS = Histogram(
+    "bot_update_seconds",
+    "Время обработки апдейта, включая коммит",
+    "handler",
+    LATENCY_BUCKETS,
+)
+DB_QUERIES = Histogram(
+    "bot_update_db_queries", "Запросов к базе за апдейт", "handler", QUERY_BUCKETS
+)
+DB_SECONDS = Histogram(
+    "bot_update_db_seconds",
+    "Время запросов к базе за апдейт",
+    "handler",
+    LATENCY_BUCKETS,
+)
+API_SECONDS = Histogram(
+    "bot_api_request_seconds",
+    "Время запроса к Bot API",
+    "method",
+    LATENCY_BUCKETS,
+)
+HISTOGRAMS = (HANDLER_SECONDS, DB_QUERIES, DB_SECONDS, API_SECONDS)
+
+
+def render_metrics() -> str:
+    return "\n".join(line for h in HISTOGRAMS for line in h.render()) + "\n"
+
+
+@dataclass
+class UpdateStats:
+    # Метку ставит HandlerLabelMiddleware, когда находится хендлер
+    handler: str = "unhandled"
+    queries: int = 0
+    db_seconds: float = 0.0
+    seconds: float = 0.0
+
+
+# Кому ещё нужна статистика каждого апдейта (нагрузочный тест считает перцентили)
+update_listeners: list[Callable[[UpdateStats], None]] = []
+
+
+# Статистика текущего апдейта. SQLAlchemy выполняет запрос в greenlet,
+# который наследует контекст вызывающей задачи, поэтому события курсора
+# видят ту же переменную
+current_update: ContextVar[UpdateStats | None] = ContextVar(
+    "current_update", default=None
+)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = current_update.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+
+
+@event.listens_for(Engine, "handle_error")
+def _query_failed(context):
+    # after_cursor_execute не придёт — убираем отметку начала
+    started = context.connection and context.connection.info.get("query_started")
+    if started:
+        started.pop()
+
+
+class BotApiTimer(BaseRequestMiddleware):
+    """Время каждого метода Bot API, включая ретраи уведомлений"""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod,
+    ) -> Response:
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            API_SECONDS.observe(method.__api_method__, time.perf_counter() - started)
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(
+        text=render_metrics(), content_type="text/plain", charset="utf-8"
+    )
+
+
+class MetricsServer:
+    """Отдельный HTTP-сервер с /metrics (и /health, /ready для режима polling),
+    по умолчанию только на localhost"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._runner: web.AppRunner | None = None
+
+    def use_worker_port(self, index: int):
+        # Основной порт у раздатчика (/health, /ready), воркеры со своими
+        # метриками — на следующих по порядку
+        if self.port:
+            self.port += index + 1
+
+    async def start(self):
+        if not self.port:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", metrics_handler)
+        add_health_routes(app)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+metrics_server = MetricsServer(METRICS_HOST, METRICS_PORT)
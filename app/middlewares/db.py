@@ -0,0 +1,29 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """Одна сессия на апдейт: передаётся в хендлер как `db`, коммит/откат один раз в конце"""
+
+    def __init__(self, session_pool: async_sessionmaker):
+        self.session_pool = session_pool
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        # Соединение берётся из пула только при первом запросе
+        async with self.session_pool() as db:
+            data["db"] = db
+            try:
+                result = await handler(event, data)
+            except Exception:
+                await db.rollback()
+                raise
+            await db.commit()
+            return result
@@ -0,0 +1,63 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject, Update
+
+from metrics import (
+    DB_QUERIES,
+    DB_SECONDS,
+    HANDLER_SECONDS,
+    UpdateStats,
+    current_update,
+    update_listeners,
+)
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Время апдейта, число запросов и время базы — по метке хендлера"""
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        stats = UpdateStats()
+        token = current_update.set(stats)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            stats.seconds = time.perf_counter() - started
+            HANDLER_SECONDS.observe(stats.handler, stats.seconds)
+            DB_QUERIES.observe(stats.handler, stats.queries)
+            DB_SECONDS.observe(stats.handler, stats.db_seconds)
+            current_update.reset(token)
+            for listener in update_listeners:
+                listener(stats)
+
+
+class HandlerLabelMiddleware(BaseMiddleware):
+    """Метка найденного хендлера: префикс callback_data или команда"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        stats = current_update.get()
+        if stats is not None:
+            stats.handler = handler_label(event, data)
+        return await handler(event, data)
+
+
+def handler_label(event: TelegramObject, data: Dict[str, Any]) -> str:
+    # Внутренний middleware вызывается только для сработавшего хендлера,
+    # так что меток не больше, чем зарегистрированных кнопок и команд
+    if isinstance(event, CallbackQuery):
+        return event.data.partition(":")[0]
+    if isinstance(event, Message) and "command" in data:
+        return f"/{data['command'].command}"
+    return data["handler"].callback.__name__
@@ -0,0 +1,63 @@
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import TelegramObject
+from sqlalchemy import event
+from sqlalchemy.orm import ORMExecuteState, Session
+
+from config import QUERY_BUDGET_DEFAULT, QUERY_BUDGET_MODE
+from metrics import current_update
+from middlewares.metrics import handler_label
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    """Хендлер сделал больше запросов, чем заявлено, или лениво загрузил связь"""
+
+
+def report(message: str):
+    if QUERY_BUDGET_MODE == "raise":
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _detect_lazy_load(orm_execute_state: ORMExecuteState):
+    # Связь не загружена заранее (joinedload/selectinload) — это запрос
+    # на каждый объект, в цикле по слотам превращается в N+1
+    if orm_execute_state.is_select and orm_execute_state.lazy_loaded_from is not None:
+        report(f"Ленивая загрузка {orm_execute_state.loader_strategy_path}")
+
+
+class QueryBudgetMiddleware(BaseMiddleware):
+    """Проверяет, что хендлер уложился в свой бюджет запросов.
+
+    Бюджет задаётся флагом при регистрации:
+    @router.callback(SelectSlot, flags={"query_budget": 2})"""
+
+    def __init__(self, default_budget: int = QUERY_BUDGET_DEFAULT):
+        self.default_budget = default_budget
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        stats = current_update.get()
+        if stats is None:
+            return await handler(event, data)
+
+        budget = get_flag(data, "query_budget", default=self.default_budget)
+        before = stats.queries
+        result = await handler(event, data)
+        used = stats.queries - before
+        if used > budget:
+            report(
+                f"{handler_label(event, data)}: {used} запросов к базе "
+                f"при бюджете {budget}"
+            )
+        return result
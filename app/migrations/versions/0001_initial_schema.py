@@ -0,0 +1,66 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 10:00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_table(name: str) -> bool:
+    # Базы, созданные раньше через create_all, уже содержат эти таблицы
+    if context.is_offline_mode():
+        return False
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not _has_table("users"):
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("telegram_id", sa.Integer(), nullable=True),
+            sa.Column("username", sa.String(), nullable=False),
+            sa.Column("first_name", sa.String(), nullable=True),
+            sa.Column("last_name", sa.String(), nullable=True),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+        op.create_index("ix_users_telegram_id", "users", ["telegram_id"], unique=True)
+
+    if not _has_table("time_slots"):
+        op.create_table(
+            "time_slots",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("start_time", sa.DateTime(), nullable=False),
+            sa.Column("end_time", sa.DateTime(), nullable=False),
+            sa.Column("is_booked", sa.Boolean(), nullable=True),
+            sa.Column("subject", sa.String(), nullable=True),
+            sa.Column("admin_id", sa.Integer(), nullable=True),
+            sa.Column("student_id", sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(["admin_id"], ["users.id"]),
+            sa.ForeignKeyConstraint(["student_id"], ["users.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_time_slots_id", "time_slots", ["id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_time_slots_id", table_name="time_slots")
+    op.drop_table("time_slots")
+    op.drop_index("ix_users_telegram_id", table_name="users")
+    op.drop_index("ix_users_id", table_name="users")
+    op.drop_table("users")
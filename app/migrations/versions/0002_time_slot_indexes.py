@@ -0,0 +1,51 @@
+"""time_slots indexes for hot queries
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 10:30:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FREE_SLOT = sa.text("student_id IS NULL AND NOT is_booked")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Календарь пользователя: свободные слоты админа в диапазоне дат
+    op.create_index(
+        "ix_time_slots_admin_free_start",
+        "time_slots",
+        ["admin_id", "start_time"],
+        postgresql_where=FREE_SLOT,
+        sqlite_where=FREE_SLOT,
+    )
+    # Слоты админа на выбранный день (select_slot_date)
+    op.create_index(
+        "ix_time_slots_admin_booked_start",
+        "time_slots",
+        ["admin_id", "is_booked", "start_time"],
+    )
+    # Занятия ученика (my_lessons)
+    op.create_index(
+        "ix_time_slots_student_booked_start",
+        "time_slots",
+        ["student_id", "is_booked", "start_time"],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_time_slots_student_booked_start", table_name="time_slots")
+    op.drop_index("ix_time_slots_admin_booked_start", table_name="time_slots")
+    op.drop_index("ix_time_slots_admin_free_start", table_name="time_slots")
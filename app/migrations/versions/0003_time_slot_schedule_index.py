@@ -0,0 +1,33 @@
+"""time_slots index for admin schedule pages
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 12:00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Постраничный просмотр расписания по ключу (start_time, id)
+    op.create_index(
+        "ix_time_slots_admin_start_id",
+        "time_slots",
+        ["admin_id", "start_time", "id"],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_time_slots_admin_start_id", table_name="time_slots")
@@ -0,0 +1,98 @@
+"""unique (admin_id, start_time, end_time) on time_slots
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 14:00:00
+
+"""
+
+from collections import defaultdict
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+time_slots = sa.table(
+    "time_slots",
+    sa.column("id", sa.Integer),
+    sa.column("admin_id", sa.Integer),
+    sa.column("start_time", sa.DateTime),
+    sa.column("end_time", sa.DateTime),
+    sa.column("student_id", sa.Integer),
+    sa.column("is_booked", sa.Boolean),
+)
+
+
+def remove_duplicates():
+    # Уникальный индекс не создастся, пока в базе есть дубли. Из каждой
+    # группы остаётся занятая (с учеником или подтверждённая) строка, а если
+    # занятых нет — самая старая. Две занятые строки на один интервал
+    # миграция не разбирает сама: останавливается и перечисляет их
+    rows = (
+        op.get_bind()
+        .execute(
+            sa.select(
+                time_slots.c.id,
+                time_slots.c.admin_id,
+                time_slots.c.start_time,
+                time_slots.c.end_time,
+                time_slots.c.student_id,
+                time_slots.c.is_booked,
+            ).order_by(time_slots.c.id)
+        )
+        .all()
+    )
+    groups = defaultdict(list)
+    for row in rows:
+        groups[(row.admin_id, row.start_time, row.end_time)].append(row)
+
+    conflicts = []
+    extra_ids = []
+    for key, group in groups.items():
+        if len(group) == 1:
+            continue
+        occupied = [
+            row.id for row in group if row.student_id is not None or row.is_booked
+        ]
+        if len(occupied) > 1:
+            conflicts.append(f"admin_id={key[0]} {key[1]}–{key[2]}: id {occupied}")
+            continue
+        keep = occupied[0] if occupied else group[0].id
+        extra_ids.extend(row.id for row in group if row.id != keep)
+
+    if conflicts:
+        raise RuntimeError(
+            "В time_slots несколько занятых слотов на один интервал, "
+            "оставьте в каждой группе один и повторите миграцию:\n"
+            + "\n".join(conflicts)
+        )
+    for start in range(0, len(extra_ids), 1000):
+        op.execute(
+            time_slots.delete().where(
+                time_slots.c.id.in_(extra_ids[start : start + 1000])
+            )
+        )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    remove_duplicates()
+    # Массовое добавление слотов пропускает дубли через ON CONFLICT DO NOTHING
+    op.create_index(
+        "uq_time_slots_admin_start_end",
+        "time_slots",
+        ["admin_id", "start_time", "end_time"],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("uq_time_slots_admin_start_end", table_name="time_slots")
@@ -0,0 +1,71 @@
+"""weekly availability rules materialized per month
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 15:00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, Sequence[str], None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "availability_rules",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("admin_id", sa.Integer(), nullable=False),
+        sa.Column("weekday", sa.Integer(), nullable=False),
+        sa.Column("start_time", sa.Time(), nullable=False),
+        sa.Column("end_time", sa.Time(), nullable=False),
+        sa.Column("valid_from", sa.Date(), nullable=False),
+        sa.Column("valid_until", sa.Date(), nullable=True),
+        sa.ForeignKeyConstraint(["admin_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_availability_rules_admin_id", "availability_rules", ["admin_id"]
+    )
+    op.create_table(
+        "rule_exceptions",
+        sa.Column("rule_id", sa.Integer(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.ForeignKeyConstraint(["rule_id"], ["availability_rules.id"]),
+        sa.PrimaryKeyConstraint("rule_id", "day"),
+    )
+    # Отметки материализации: повторный просмотр месяца не создаёт слоты заново
+    op.create_table(
+        "rule_months",
+        sa.Column("rule_id", sa.Integer(), nullable=False),
+        sa.Column("year", sa.Integer(), nullable=False),
+        sa.Column("month", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["rule_id"], ["availability_rules.id"]),
+        sa.PrimaryKeyConstraint("rule_id", "year", "month"),
+    )
+    with op.batch_alter_table("time_slots") as batch_op:
+        batch_op.add_column(sa.Column("rule_id", sa.Integer(), nullable=True))
+        batch_op.create_foreign_key(
+            "fk_time_slots_rule_id", "availability_rules", ["rule_id"], ["id"]
+        )
+        batch_op.create_index("ix_time_slots_rule_start", ["rule_id", "start_time"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("time_slots") as batch_op:
+        batch_op.drop_index("ix_time_slots_rule_start")
+        batch_op.drop_constraint("fk_time_slots_rule_id", type_="foreignkey")
+        batch_op.drop_column("rule_id")
+    op.drop_table("rule_months")
+    op.drop_table("rule_exceptions")
+    op.drop_index("ix_availability_rules_admin_id", table_name="availability_rules")
+    op.drop_table("availability_rules")
@@ -0,0 +1,134 @@
+"""forbid overlapping time_slots of one admin
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 16:00:00
+
+"""
+
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, Sequence[str], None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# В SQLite нет EXCLUDE: пересекающаяся строка молча пропускается,
+# как при ON CONFLICT DO NOTHING, и не попадает в RETURNING.
+# Пересоздание таблицы (batch_alter_table) удаляет триггер — его нужно
+# создать заново в той же миграции.
+SQLITE_TRIGGER = """
+CREATE TRIGGER tr_time_slots_no_overlap
+BEFORE INSERT ON time_slots
+WHEN EXISTS (
+    SELECT 1 FROM time_slots
+    WHERE admin_id = NEW.admin_id
+      AND start_time < NEW.end_time
+      AND NEW.start_time < end_time
+)
+BEGIN
+    SELECT RAISE(IGNORE);
+END
+"""
+
+
+time_slots = sa.table(
+    "time_slots",
+    sa.column("id", sa.Integer),
+    sa.column("admin_id", sa.Integer),
+    sa.column("start_time", sa.DateTime),
+    sa.column("end_time", sa.DateTime),
+    sa.column("student_id", sa.Integer),
+    sa.column("is_booked", sa.Boolean),
+)
+
+
+def remove_overlaps():
+    # Ограничение не создастся, пока в базе есть пересечения. Занятые
+    # слоты (с учеником или подтверждённые) идут первыми, затем по id:
+    # свободный слот, который пересекается с оставленным, удаляется.
+    # Пересечение двух занятых миграция не разбирает сама: останавливается
+    # до удаления чего-либо и перечисляет их
+    rows = (
+        op.get_bind()
+        .execute(
+            sa.select(
+                time_slots.c.id,
+                time_slots.c.admin_id,
+                time_slots.c.start_time,
+                time_slots.c.end_time,
+                time_slots.c.student_id,
+                time_slots.c.is_booked,
+            )
+        )
+        .all()
+    )
+    rows.sort(
+        key=lambda row: (
+            row.admin_id,
+            row.student_id is None and not row.is_booked,
+            row.id,
+        )
+    )
+
+    # Оставленные интервалы админа не пересекаются, поэтому отсортированы
+    # и по началу, и по концу: соседа слева находит bisect
+    kept = defaultdict(lambda: ([], [], []))
+    conflicts = []
+    extra_ids = []
+    for row in rows:
+        starts, ends, ids = kept[row.admin_id]
+        index = bisect_left(starts, row.end_time)
+        if index and ends[index - 1] > row.start_time:
+            if row.student_id is not None or row.is_booked:
+                conflicts.append(
+                    f"admin_id={row.admin_id}: id {row.id} "
+                    f"({row.start_time}–{row.end_time}) пересекается с id {ids[index - 1]}"
+                )
+            else:
+                extra_ids.append(row.id)
+            continue
+        starts.insert(index, row.start_time)
+        ends.insert(index, row.end_time)
+        ids.insert(index, row.id)
+
+    if conflicts:
+        raise RuntimeError(
+            "В time_slots пересекаются занятые слоты, разведите их "
+            "и повторите миграцию:\n" + "\n".join(conflicts)
+        )
+    for start in range(0, len(extra_ids), 1000):
+        op.execute(
+            time_slots.delete().where(
+                time_slots.c.id.in_(extra_ids[start : start + 1000])
+            )
+        )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    remove_overlaps()
+    if op.get_context().dialect.name == "postgresql":
+        # Интервалы [start, end) одного админа не пересекаются; ON CONFLICT
+        # DO NOTHING без указания индекса пропускает и такие строки
+        op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+        op.execute(
+            "ALTER TABLE time_slots ADD CONSTRAINT ex_time_slots_admin_overlap "
+            "EXCLUDE USING gist (admin_id WITH =, tsrange(start_time, end_time) WITH &&)"
+        )
+    else:
+        op.execute(SQLITE_TRIGGER)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_context().dialect.name == "postgresql":
+        op.drop_constraint("ex_time_slots_admin_overlap", "time_slots")
+    else:
+        op.execute("DROP TRIGGER tr_time_slots_no_overlap")
@@ -0,0 +1,63 @@
+"""archive table for finished time_slots
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 17:00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, Sequence[str], None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # time_slots не пересоздаётся, так что триггер из 0007 остаётся на месте
+    op.create_table(
+        "time_slots_archive",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("slot_id", sa.Integer(), nullable=False),
+        sa.Column("start_time", sa.DateTime(), nullable=False),
+        sa.Column("end_time", sa.DateTime(), nullable=False),
+        sa.Column("is_booked", sa.Boolean(), nullable=True),
+        sa.Column("subject", sa.String(), nullable=True),
+        sa.Column("admin_id", sa.Integer(), nullable=True),
+        sa.Column("student_id", sa.Integer(), nullable=True),
+        sa.Column("rule_id", sa.Integer(), nullable=True),
+        sa.Column(
+            "archived_at",
+            sa.DateTime(),
+            server_default=sa.func.now(),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_time_slots_archive_admin_start_id",
+        "time_slots_archive",
+        ["admin_id", "start_time", "id"],
+    )
+    op.create_index(
+        "ix_time_slots_archive_student_start",
+        "time_slots_archive",
+        ["student_id", "start_time"],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "ix_time_slots_archive_student_start", table_name="time_slots_archive"
+    )
+    op.drop_index(
+        "ix_time_slots_archive_admin_start_id", table_name="time_slots_archive"
+    )
+    op.drop_table("time_slots_archive")
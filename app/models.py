@@ -1,4 +1,18 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    Integer,
+    String,
+    ForeignKey,
+    Date,
+    DateTime,
+    Boolean,
+    Index,
+    JSON,
+    Time,
+    func,
+    text,
+)
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -21,8 +35,41 @@ class User(Base):
     )
 
 
+FREE_SLOT = text("student_id IS NULL AND NOT is_booked")
+
+
 class TimeSlot(Base):
     __tablename__ = "time_slots"
+    # Индексы под запросы хендлеров, создаются миграциями 0002, 0003, 0005 и 0006
+    __table_args__ = (
+        Index(
+            "ix_time_slots_admin_free_start",
+            "admin_id",
+            "start_time",
+            postgresql_where=FREE_SLOT,
+            sqlite_where=FREE_SLOT,
+        ),
+        Index(
+            "ix_time_slots_admin_booked_start", "admin_id", "is_booked", "start_time"
+        ),
+        Index(
+            "ix_time_slots_student_booked_start",
+            "student_id",
+            "is_booked",
+            "start_time",
+        ),
+        Index("ix_time_slots_admin_start_id", "admin_id", "start_time", "id"),
+        Index("ix_time_slots_rule_start", "rule_id", "start_time"),
+        # Один и тот же интервал у админа один раз. Пересечения интервалов
+        # запрещает миграция 0007: EXCLUDE в PostgreSQL, триггер в SQLite
+        Index(
+            "uq_time_slots_admin_start_end",
+            "admin_id",
+            "start_time",
+            "end_time",
+            unique=True,
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     start_time = Column(DateTime, nullable=False)
@@ -43,3 +90,91 @@ class TimeSlot(Base):
     student = relationship(
         "User", back_populates="booked_slots", foreign_keys=[student_id]
     )
+
+    # Правило, из которого слот создан (пусто у слотов, добавленных вручную)
+    rule_id = Column(Integer, ForeignKey("availability_rules.id"), nullable=True)
+
+
+class ArchivedTimeSlot(Base):
+    """Закончившийся слот: переносится сюда из time_slots фоновой задачей"""
+
+    __tablename__ = "time_slots_archive"
+    # История читается страницами по админу и списком по ученику (миграция 0008)
+    __table_args__ = (
+        Index("ix_time_slots_archive_admin_start_id", "admin_id", "start_time", "id"),
+        Index("ix_time_slots_archive_student_start", "student_id", "start_time"),
+    )
+
+    # Свой ключ: SQLite может выдать id удалённой строки time_slots новому
+    # слоту, и его перенос упёрся бы в уже заархивированный id. Исходный id
+    # хранится в slot_id без уникальности. Внешних ключей нет, чтобы
+    # удаление правил и пользователей не упиралось в многолетний архив
+    id = Column(Integer, primary_key=True)
+    slot_id = Column(Integer, nullable=False)
+    start_time = Column(DateTime, nullable=False)
+    end_time = Column(DateTime, nullable=False)
+    is_booked = Column(Boolean, default=False)
+    subject = Column(String, nullable=True)
+    admin_id = Column(Integer, nullable=True)
+    student_id = Column(Integer, nullable=True)
+    rule_id = Column(Integer, nullable=True)
+    archived_at = Column(DateTime, nullable=False, server_default=func.now())
+
+
+class SentReminder(Base):
+    """Отправленное напоминание. Его вставляет процесс, который отправляет
+    первым, — остальные процессы с тем же занятием в куче его пропускают"""
+
+    __tablename__ = "sent_reminders"
+
+    # Внешнего ключа нет: отметки удаляет архиватор вместе со слотом
+    slot_id = Column(Integer, primary_key=True)
+    # id чатов Telegram выходят за int4
+    chat_id = Column(BigInteger, primary_key=True)
+    offset_minutes = Column(Integer, primary_key=True)
+    sent_at = Column(DateTime, nullable=False, server_default=func.now())
+
+
+class AvailabilityRule(Base):
+    """Еженедельный слот админа: слоты из него создаются по мере просмотра месяцев"""
+
+    __tablename__ = "availability_rules"
+
+    id = Column(Integer, primary_key=True)
+    admin_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    weekday = Column(Integer, nullable=False)  # 0 — понедельник
+    start_time = Column(Time, nullable=False)
+    end_time = Column(Time, nullable=False)
+    valid_from = Column(Date, nullable=False)
+    valid_until = Column(Date, nullable=True)  # включительно, пусто — бессрочно
+
+
+class RuleException(Base):
+    """День, в который правило не действует"""
+
+    __tablename__ = "rule_exceptions"
+
+    rule_id = Column(Integer, ForeignKey("availability_rules.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+
+
+class RuleMonth(Base):
+    """Отметка, что слоты правила на этот месяц уже созданы"""
+
+    __tablename__ = "rule_months"
+
+    rule_id = Column(Integer, ForeignKey("availability_rules.id"), primary_key=True)
+    year = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)
+
+
+class FsmState(Base):
+    """Состояние FSM и его данные, ключ собирается KeyBuilder'ом aiogram"""
+
+    __tablename__ = "fsm_states"
+
+    key = Column(String, primary_key=True)
+    state = Column(String, nullable=True)
+    data = Column(JSON, nullable=False, default=dict)
+    # Брошенные состояния после этого времени считаются пустыми и удаляются
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -0,0 +1,89 @@
+import asyncio
+import logging
+from datetime import datetime
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from config import ARCHIVE_BATCH_SIZE, ARCHIVE_INTERVAL
+from database import SessionLocal
+from models import ArchivedTimeSlot, SentReminder, TimeSlot
+
+logger = logging.getLogger(__name__)
+
+# Колонки архива в порядке колонок time_slots: исходный id попадает в
+# slot_id, свой id и archived_at проставляет база
+ARCHIVED_COLUMNS = [
+    "slot_id" if column.name == "id" else column.name
+    for column in TimeSlot.__table__.columns
+]
+
+
+class SlotArchiver:
+    """Переносит закончившиеся слоты в архив, чтобы time_slots не рос годами"""
+
+    def __init__(
+        self, session_pool: async_sessionmaker, interval: int, batch_size: int
+    ):
+        self.session_pool = session_pool
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: asyncio.Task | None = None
+
+    async def archive_batch(self, before: datetime) -> int:
+        # Копирование и удаление в одной транзакции: слот либо в time_slots,
+        # либо в архиве. Короткие пачки не держат блокировки подолгу
+        async with self.session_pool.begin() as db:
+            ids = list(
+                await db.scalars(
+                    select(TimeSlot.id)
+                    .where(TimeSlot.end_time < before)
+                    .order_by(TimeSlot.end_time)
+                    .limit(self.batch_size)
+                )
+            )
+            if not ids:
+                return 0
+            await db.execute(
+                insert(ArchivedTimeSlot).from_select(
+                    ARCHIVED_COLUMNS,
+                    select(*TimeSlot.__table__.columns).where(TimeSlot.id.in_(ids)),
+                )
+            )
+            await db.execute(delete(TimeSlot).where(TimeSlot.id.in_(ids)))
+            # Отметки о напоминаниях нужны, только пока занятие впереди
+            await db.execute(delete(SentReminder).where(SentReminder.slot_id.in_(ids)))
+            return len(ids)
+
+    async def archive(self) -> int:
+        before = datetime.now()
+        total = 0
+        while True:
+            moved = await self.archive_batch(before)
+            total += moved
+            if moved < self.batch_size:
+                return total
+            # Между пачками даём поработать хендлерам
+            await asyncio.sleep(0)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                moved = await self.archive()
+                if moved:
+                    logger.info("В архив перенесено слотов: %s", moved)
+            except Exception:
+                logger.exception("Не удалось перенести слоты в архив")
+            await asyncio.sleep(self.interval)
+
+
+archiver = SlotArchiver(SessionLocal, ARCHIVE_INTERVAL, ARCHIVE_BATCH_SIZE)
@@ -0,0 +1,185 @@
+import time
+from collections import Counter
+from datetime import date, datetime, time as dt_time, timedelta
+from typing import Awaitable, Callable
+
+from sqlalchemy import Date, Row, exists, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import AVAILABILITY_TTL
+from database import on_commit
+from models import TimeSlot
+
+
+def month_bounds(year: int, month: int) -> tuple[date, date]:
+    # Первый день месяца и первый день следующего
+    return date(year, month, 1), date(year + month // 12, month % 12 + 1, 1)
+
+
+class AvailabilityIndex:
+    """Количество свободных слотов по дням, разложенное по месяцам каждого админа"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        # (admin_id, year, month) -> (время загрузки, {день: свободных слотов})
+        self._months: dict[tuple[int, int, int], tuple[float, Counter]] = {}
+        # (admin_id, year, month) -> (время проверки, есть ли свободные слоты)
+        self._has_free: dict[tuple[int, int, int], tuple[float, bool]] = {}
+
+    def _fresh(self, loaded_at: float) -> bool:
+        return time.monotonic() - loaded_at < self.ttl
+
+    def month(self, key: tuple[int, int, int]) -> Counter | None:
+        entry = self._months.get(key)
+        if entry is None or not self._fresh(entry[0]):
+            return None
+        return entry[1]
+
+    def load_month(self, key: tuple[int, int, int], counts: dict[date, int]):
+        self._months[key] = (time.monotonic(), Counter(counts))
+
+    def has_free(self, key: tuple[int, int, int]) -> bool | None:
+        days = self.month(key)
+        if days is not None:
+            return bool(days)
+        entry = self._has_free.get(key)
+        if entry is None or not self._fresh(entry[0]):
+            return None
+        return entry[1]
+
+    def remember_has_free(self, key: tuple[int, int, int], value: bool):
+        self._has_free[key] = (time.monotonic(), value)
+
+    def change(self, admin_id: int, day: date, delta: int):
+        key = (admin_id, day.year, day.month)
+        # Незагруженный месяц не трогаем — он прочитается из базы при показе
+        entry = self._months.get(key)
+        if entry is not None:
+            days = entry[1]
+            days[day] += delta
+            if days[day] <= 0:
+                del days[day]
+        checked = self._has_free.get(key)
+        if checked is not None:
+            if delta > 0:
+                self._has_free[key] = (checked[0], True)
+            else:
+                # После занятия слота ответ неизвестен — перепроверим запросом
+                del self._has_free[key]
+
+    def correct_day(self, admin_id: int, day: date, free: int):
+        # Счёт дня, только что прочитанный из базы. Слоты мог занять другой
+        # процесс (WORKERS, несколько экземпляров вебхука), а его on_commit
+        # сюда не доходит — без этого день висел бы в календаре до TTL
+        key = (admin_id, day.year, day.month)
+        entry = self._months.get(key)
+        if entry is not None:
+            days = entry[1]
+            if free:
+                days[day] = free
+            else:
+                days.pop(day, None)
+        checked = self._has_free.get(key)
+        if checked is not None and free:
+            self._has_free[key] = (checked[0], True)
+
+    def invalidate(self, admin_id: int):
+        for cache in (self._months, self._has_free):
+            for key in [key for key in cache if key[0] == admin_id]:
+                del cache[key]
+
+
+availability = AvailabilityIndex(AVAILABILITY_TTL)
+
+
+def _free_slots(admin_id: int, start: date, end: date):
+    # Условие «свободный слот админа в полуинтервале [start, end)»,
+    # попадает в частичный индекс ix_time_slots_admin_free_start
+    return (
+        TimeSlot.admin_id == admin_id,
+        TimeSlot.is_booked == False,
+        TimeSlot.student_id == None,
+        TimeSlot.start_time >= datetime.combine(start, dt_time.min),
+        TimeSlot.start_time < datetime.combine(end, dt_time.min),
+    )
+
+
+async def fetch_free_days(
+    db: AsyncSession, admin_id: int, start: date, end: date
+) -> dict[date, int]:
+    slot_date = func.date(TimeSlot.start_time, type_=Date)
+    rows = await db.execute(
+        select(slot_date, func.count())
+        .where(*_free_slots(admin_id, start, end))
+        .group_by(slot_date)
+    )
+    return dict(rows.all())
+
+
+async def has_free_slots(
+    db: AsyncSession, admin_id: int, start: date, end: date
+) -> bool:
+    return await db.scalar(select(exists().where(*_free_slots(admin_id, start, end))))
+
+
+async def get_month_availability(
+    db: AsyncSession,
+    admin_id: int,
+    year: int,
+    month: int,
+    min_date: date,
+    max_date: date,
+    materialize: Callable[..., Awaitable[int]] | None = None,
+) -> tuple[set[date], bool, bool]:
+    """Свободные дни месяца в окне [min_date, max_date] и есть ли они в соседних месяцах
+
+    materialize(db, admin_id, year, month, min_date) досоздаёт слоты месяца
+    (например, из еженедельных правил) перед тем, как месяц читается из базы.
+    """
+    window_end = max_date + timedelta(days=1)
+
+    key = (admin_id, year, month)
+    days = availability.month(key)
+    if days is None:
+        if materialize is not None:
+            await materialize(db, admin_id, year, month, min_date)
+        start, end = month_bounds(year, month)
+        start, end = max(start, min_date), min(end, window_end)
+        days = Counter()
+        if start < end:
+            days.update(await fetch_free_days(db, admin_id, start, end))
+        availability.load_month(key, days)
+    available_dates = set(d for d in days if min_date <= d <= max_date)
+
+    async def neighbour_has_free(start: date) -> bool:
+        _, end = month_bounds(start.year, start.month)
+        start, end = max(start, min_date), min(end, window_end)
+        if start >= end:
+            return False
+        key = (admin_id, start.year, start.month)
+        has_free = availability.has_free(key)
+        if has_free is None:
+            if materialize is not None:
+                await materialize(db, admin_id, start.year, start.month, min_date)
+            has_free = await has_free_slots(db, admin_id, start, end)
+            availability.remember_has_free(key, has_free)
+        return has_free
+
+    first_day, next_first_day = month_bounds(year, month)
+    prev_first_day = (first_day - timedelta(days=1)).replace(day=1)
+    return (
+        available_dates,
+        await neighbour_has_free(prev_first_day),
+        await neighbour_has_free(next_first_day),
+    )
+
+
+def slot_freed(db: AsyncSession, slot: TimeSlot | Row):
+    # Индекс меняем только после коммита, чтобы откат не испортил счётчики
+    admin_id, day = slot.admin_id, slot.start_time.date()
+    on_commit(db, lambda: availability.change(admin_id, day, 1))
+
+
+def slot_taken(db: AsyncSession, slot: TimeSlot | Row):
+    admin_id, day = slot.admin_id, slot.start_time.date()
+    on_commit(db, lambda: availability.change(admin_id, day, -1))
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from functools import partial
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import (
+    NOTIFY_CHAT_RATE,
+    NOTIFY_GLOBAL_RATE,
+    NOTIFY_MAX_RETRIES,
+    NOTIFY_WORKERS,
+)
+from database import on_commit
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Не больше `rate` отправок в секунду, всплеском до `capacity`"""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def delay(self) -> float:
+        # Сколько ждать до следующего токена (0 — можно отправлять сразу)
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.delay()  # сначала пополняем токены на текущий момент
+        self.tokens -= 1
+
+
+class Notifier:
+    """Фоновая отправка сообщений: хендлер только ставит их в очередь"""
+
+    def __init__(
+        self,
+        bot: Bot | None = None,
+        global_rate: float = NOTIFY_GLOBAL_RATE,
+        chat_rate: float = NOTIFY_CHAT_RATE,
+        workers: int = NOTIFY_WORKERS,
+        max_retries: int = NOTIFY_MAX_RETRIES,
+    ):
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.workers = workers
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, capacity=global_rate)
+        self._chats: dict[int, TokenBucket] = {}
+        # Сообщения каждого чата отправляются по порядку; в `_ready` чат
+        # стоит не больше одного раза, поэтому воркеры не делят один чат
+        self._pending: dict[int, deque] = {}
+        self._ready: asyncio.Queue[int] = asyncio.Queue()
+        self._paused_until = 0.0
+        self._tasks: list[asyncio.Task] = []
+
+    def send(self, chat_id: int, text: str, **kwargs):
+        if chat_id not in self._pending:
+            self._pending[chat_id] = deque()
+            self._ready.put_nowait(chat_id)
+        self._pending[chat_id].append((text, kwargs, 0))
+
+    def send_after_commit(self, db: AsyncSession, chat_id: int, text: str, **kwargs):
+        # Уведомление уйдёт, только если изменения в базе действительно сохранились
+        on_commit(db, partial(self.send, chat_id, text, **kwargs))
+
+    def share_rate(self, processes: int):
+        # Общий лимит бота делится поровну между процессами-воркерами
+        rate = self._global.rate / processes
+        self._global = TokenBucket(rate, capacity=rate)
+
+    async def start(self, bot: Bot):
+        # Bot передаёт диспетчер в startup — он создаётся в create_app
+        self.bot = bot
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10):
+        # Даём дослать накопившееся, но не ждём бесконечно
+        deadline = time.monotonic() + timeout
+        while self._pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _wait_global(self):
+        while True:
+            delay = max(self._paused_until - time.monotonic(), self._global.delay())
+            if delay <= 0:
+                self._global.take()
+                return
+            await asyncio.sleep(delay)
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            chat_id = await self._ready.get()
+
+            bucket = self._chats.setdefault(chat_id, TokenBucket(self.chat_rate))
+            delay = bucket.delay()
+            if delay > 0:
+                # Чат ещё не остыл — вернём его в очередь позже, не блокируя других
+                loop.call_later(delay, self._ready.put_nowait, chat_id)
+                continue
+
+            await self._wait_global()
+            bucket.take()
+            messages = self._pending[chat_id]
+            text, kwargs, attempt = messages.popleft()
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+            except TelegramRetryAfter as e:
+                # Флуд-контроль общий для бота — притормаживаем все отправки
+                self._paused_until = time.monotonic() + e.retry_after
+                if attempt < self.max_retries:
+                    messages.appendleft((text, kwargs, attempt + 1))
+                else:
+                    logger.warning("Уведомление в чат %s не отправлено: %s", chat_id, e)
+            except TelegramAPIError as e:
+                logger.warning("Уведомление в чат %s не отправлено: %s", chat_id, e)
+            except Exception:
+                logger.exception("Ошибка при отправке уведомления в чат %s", chat_id)
+
+            if messages:
+                self._ready.put_nowait(chat_id)
+            else:
+                del self._pending[chat_id]
+                loop.call_later(1 / self.chat_rate, self._forget_chat, chat_id)
+
+    def _forget_chat(self, chat_id: int):
+        # Остывший чат без сообщений больше не нужен, чтобы словарь не рос
+        if chat_id not in self._pending:
+            self._chats.pop(chat_id, None)
+
+
+notifier = Notifier()
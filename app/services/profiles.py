@@ -0,0 +1,123 @@
+import asyncio
+import logging
+from collections import OrderedDict
+
+from aiogram.types import User as TelegramUser
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from config import PROFILE_FLUSH_INTERVAL, USER_CACHE_SIZE
+from database import SessionLocal, dialect_insert, on_commit
+from models import User
+from services.user_cache import user_ids
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FIELDS = ("username", "first_name", "last_name")
+
+Profile = tuple[str, str, str]
+
+
+def get_profile(user: TelegramUser) -> Profile:
+    return (user.username or "", user.first_name or "", user.last_name or "")
+
+
+def upsert_users(db: AsyncSession, profiles: dict[int, Profile]):
+    # Один INSERT ... ON CONFLICT (telegram_id) DO UPDATE на всех пользователей
+    stmt = dialect_insert(db, User.__table__).values(
+        [
+            {"telegram_id": telegram_id, **dict(zip(PROFILE_FIELDS, profile))}
+            for telegram_id, profile in profiles.items()
+        ]
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[User.telegram_id],
+        set_={field: stmt.excluded[field] for field in PROFILE_FIELDS},
+    )
+
+
+class ProfileSync:
+    """Профили из /start: знакомый пользователь без изменений не трогает базу,
+    изменения копятся и пишутся в фоне одним запросом"""
+
+    def __init__(self, session_pool: async_sessionmaker, interval: float, maxsize: int):
+        self.session_pool = session_pool
+        self.interval = interval
+        self.maxsize = maxsize
+        # Последний записанный (или поставленный в очередь) профиль
+        self._seen: OrderedDict[int, Profile] = OrderedDict()
+        self._pending: dict[int, Profile] = {}
+        self._task: asyncio.Task | None = None
+
+    def _remember(self, telegram_id: int, profile: Profile):
+        self._seen[telegram_id] = profile
+        self._seen.move_to_end(telegram_id)
+        while len(self._seen) > self.maxsize:
+            self._seen.popitem(last=False)
+
+    def forget(self, telegram_id: int):
+        self._seen.pop(telegram_id, None)
+        self._pending.pop(telegram_id, None)
+
+    async def ensure_user(self, db: AsyncSession, user: TelegramUser) -> int:
+        """users.id пользователя; новый сразу записывается в базу"""
+        profile = get_profile(user)
+        user_id = user_ids.get(user.id)
+        if user_id is not None:
+            if self._seen.get(user.id) != profile:
+                # Строка уже есть — обновление профиля может подождать
+                self._pending[user.id] = profile
+                self._remember(user.id, profile)
+            return user_id
+
+        user_id = await db.scalar(
+            upsert_users(db, {user.id: profile}).returning(User.id)
+        )
+        self._pending.pop(user.id, None)
+
+        def remember():
+            user_ids.put(user.id, user_id)
+            self._remember(user.id, profile)
+
+        on_commit(db, remember)
+        return user_id
+
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            async with self.session_pool.begin() as db:
+                await db.execute(upsert_users(db, pending))
+        except Exception:
+            # Не записанное вернётся в очередь, если его не обновили заново
+            for telegram_id, profile in pending.items():
+                self._pending.setdefault(telegram_id, profile)
+            raise
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Накопленное за последний интервал не теряем
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Не удалось обновить профили пользователей")
+
+
+profiles = ProfileSync(SessionLocal, PROFILE_FLUSH_INTERVAL, USER_CACHE_SIZE)
+
+
+@event.listens_for(User, "after_delete")
+def _forget_deleted_user(mapper, connection, target: User):
+    profiles.forget(target.telegram_id)
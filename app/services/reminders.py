@@ -0,0 +1,201 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from config import REMINDER_OFFSETS
+from database import SessionLocal, dialect_insert, on_commit
+from models import SentReminder, TimeSlot, User
+from services.notifier import notifier
+
+logger = logging.getLogger(__name__)
+
+
+def offset_minutes(offset: timedelta) -> int:
+    return int(offset.total_seconds() // 60)
+
+
+def format_offset(offset: timedelta) -> str:
+    minutes = offset_minutes(offset)
+    if minutes % 60:
+        return f"{minutes} мин"
+    return f"{minutes // 60} ч"
+
+
+@dataclass(eq=False)
+class Lesson:
+    slot_id: int
+    chat_id: int
+    start_time: datetime
+    end_time: datetime
+
+
+class ReminderScheduler:
+    """Напоминания о занятиях: куча по времени отправки, между событиями база не опрашивается"""
+
+    def __init__(self, session_pool: async_sessionmaker, offsets: list[timedelta]):
+        self.session_pool = session_pool
+        # От раннего напоминания к позднему: 24 ч, потом 1 ч
+        self.offsets = sorted(offsets, reverse=True)
+        # (время отправки, порядковый номер, занятие, номер напоминания, последнее ли)
+        self._heap: list[tuple[datetime, int, Lesson, int, bool]] = []
+        self._counter = itertools.count()
+        # Актуальное занятие по слоту; записи кучи от отменённых занятий
+        # не удаляются, а пропускаются при срабатывании
+        self._lessons: dict[int, Lesson] = {}
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def schedule(
+        self, slot_id: int, chat_id: int, start_time: datetime, end_time: datetime
+    ):
+        lesson = Lesson(slot_id, chat_id, start_time, end_time)
+        now = datetime.now()
+        pending = [
+            (start_time - offset, index)
+            for index, offset in enumerate(self.offsets)
+            if start_time - offset > now
+        ]
+        if not pending:
+            self._lessons.pop(slot_id, None)
+            return
+        self._lessons[slot_id] = lesson
+        for fire_at, index in pending:
+            is_last = index == pending[-1][1]
+            heapq.heappush(
+                self._heap, (fire_at, next(self._counter), lesson, index, is_last)
+            )
+        # Новое напоминание может оказаться ближе текущего ожидания
+        self._wakeup.set()
+
+    def cancel(self, slot_id: int):
+        self._lessons.pop(slot_id, None)
+
+    def schedule_after_commit(self, db: AsyncSession, slot):
+        # slot — результат approve_slot (id, start_time, end_time, telegram_id)
+        on_commit(
+            db,
+            lambda: self.schedule(
+                slot.id, slot.telegram_id, slot.start_time, slot.end_time
+            ),
+        )
+
+    def cancel_after_commit(self, db: AsyncSession, slot_id: int):
+        on_commit(db, lambda: self.cancel(slot_id))
+
+    async def load(self):
+        # Забронированные будущие занятия — один запрос при старте
+        async with self.session_pool() as db:
+            rows = await db.execute(
+                select(
+                    TimeSlot.id,
+                    User.telegram_id,
+                    TimeSlot.start_time,
+                    TimeSlot.end_time,
+                )
+                .join(User, User.id == TimeSlot.student_id)
+                .where(TimeSlot.is_booked == True, TimeSlot.start_time > datetime.now())
+            )
+            for row in rows:
+                self.schedule(*row)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _pop_due(self) -> list[tuple[Lesson, int]]:
+        now = datetime.now()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _, lesson, index, is_last = heapq.heappop(self._heap)
+            if self._lessons.get(lesson.slot_id) is not lesson:
+                continue
+            due.append((lesson, index))
+            if is_last:
+                # Последнее напоминание — занятие больше не отслеживаем
+                del self._lessons[lesson.slot_id]
+        return due
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            due = self._pop_due()
+            if due:
+                try:
+                    await self._fire(due)
+                except Exception:
+                    logger.exception("Не удалось отправить напоминания")
+            timeout = None
+            if self._heap:
+                timeout = (self._heap[0][0] - datetime.now()).total_seconds()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, due: list[tuple[Lesson, int]]):
+        # Отмена могла пройти в другом процессе — сверяемся с базой одним
+        # запросом на все наступившие напоминания
+        async with self.session_pool.begin() as db:
+            rows = await db.execute(
+                select(TimeSlot.id, TimeSlot.start_time, User.telegram_id)
+                .join(User, User.id == TimeSlot.student_id)
+                .where(
+                    TimeSlot.id.in_({lesson.slot_id for lesson, _ in due}),
+                    TimeSlot.is_booked == True,
+                )
+            )
+            booked = {(row.id, row.start_time, row.telegram_id) for row in rows}
+            pending = {
+                (
+                    lesson.slot_id,
+                    lesson.chat_id,
+                    offset_minutes(self.offsets[index]),
+                ): lesson
+                for lesson, index in due
+                if (lesson.slot_id, lesson.start_time, lesson.chat_id) in booked
+            }
+            if not pending:
+                return
+            # Занятие может стоять в куче у нескольких процессов (запись
+            # обработал один воркер, при старте загрузил другой): отправляет
+            # тот, чья отметка вставилась
+            claimed = await db.execute(
+                dialect_insert(db, SentReminder)
+                .values(
+                    [
+                        {"slot_id": slot_id, "chat_id": chat_id, "offset_minutes": m}
+                        for slot_id, chat_id, m in pending
+                    ]
+                )
+                .on_conflict_do_nothing()
+                .returning(
+                    SentReminder.slot_id,
+                    SentReminder.chat_id,
+                    SentReminder.offset_minutes,
+                )
+            )
+            claimed = [tuple(row) for row in claimed]
+
+        for key in claimed:
+            lesson = pending[key]
+            start = lesson.start_time.strftime("%d-%m-%Y %H:%M")
+            end = lesson.end_time.strftime("%H:%M")
+            notifier.send(
+                lesson.chat_id,
+                f"⏰ Напоминание: занятие {start} - {end} "
+                f"через {format_offset(timedelta(minutes=key[2]))}.",
+            )
+
+
+reminders = ReminderScheduler(SessionLocal, REMINDER_OFFSETS)
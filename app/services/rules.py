@@ -0,0 +1,231 @@
+import re
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import delete, exists, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import dialect_insert, on_commit
+from models import AvailabilityRule, RuleException, RuleMonth, TimeSlot
+from services.availability import availability, month_bounds
+
+# Еженедельные правила не превращаются в слоты заранее: строки time_slots
+# создаются, когда месяц впервые показывают (materialize_month). Отметка
+# в rule_months делает это один раз, а ограничения time_slots (уникальный
+# интервал и запрет пересечений) не дают создать дубль при гонке запросов.
+
+WEEKDAYS = ["пн", "вт", "ср", "чт", "пт", "сб", "вс"]
+
+RULE_PATTERN = re.compile(
+    r"^(?P<weekday>пн|вт|ср|чт|пт|сб|вс)\s+"
+    r"(?P<start>\d{2}:\d{2})\s*-\s*(?P<end>\d{2}:\d{2})"
+    r"(?:\s+с\s+(?P<valid_from>\d{2}-\d{2}-\d{4}))?"
+    r"(?:\s+до\s+(?P<valid_until>\d{2}-\d{2}-\d{4}))?$",
+    re.IGNORECASE,
+)
+
+
+def format_rule(rule: AvailabilityRule) -> str:
+    text = (
+        f"{WEEKDAYS[rule.weekday].capitalize()} "
+        f"{rule.start_time:%H:%M} - {rule.end_time:%H:%M}"
+    )
+    if rule.valid_until:
+        text += f" до {rule.valid_until:%d-%m-%Y}"
+    return text
+
+
+def parse_rules(text: str, today: date) -> tuple[list[dict], list[str]]:
+    """Правила вида «Пн 12:00 - 13:00 [с ДД-ММ-ГГГГ] [до ДД-ММ-ГГГГ]», по одному на строку"""
+    rules, invalid = [], []
+    for item in text.split("\n"):
+        item = item.strip()
+        if not item:
+            continue
+        match = RULE_PATTERN.match(item)
+        if not match:
+            invalid.append(item)
+            continue
+        try:
+            start = datetime.strptime(match["start"], "%H:%M").time()
+            end = datetime.strptime(match["end"], "%H:%M").time()
+            valid_from, valid_until = [
+                datetime.strptime(value, "%d-%m-%Y").date() if value else None
+                for value in (match["valid_from"], match["valid_until"])
+            ]
+        except ValueError:
+            invalid.append(item)
+            continue
+        valid_from = max(valid_from or today, today)
+        if end <= start or (valid_until and valid_until < valid_from):
+            invalid.append(item)
+            continue
+        rules.append(
+            {
+                "weekday": WEEKDAYS.index(match["weekday"].lower()),
+                "start_time": start,
+                "end_time": end,
+                "valid_from": valid_from,
+                "valid_until": valid_until,
+            }
+        )
+    return rules, invalid
+
+
+async def get_rules(db: AsyncSession, admin_id: int) -> list[AvailabilityRule]:
+    return list(
+        await db.scalars(
+            select(AvailabilityRule)
+            .where(AvailabilityRule.admin_id == admin_id)
+            .order_by(AvailabilityRule.weekday, AvailabilityRule.start_time)
+        )
+    )
+
+
+async def add_rules(
+    db: AsyncSession, admin_id: int, rules: list[dict]
+) -> list[AvailabilityRule]:
+    created = [AvailabilityRule(admin_id=admin_id, **values) for values in rules]
+    db.add_all(created)
+    await db.flush()
+    # Уже загруженные месяцы не знают о новых правилах — перечитаем их
+    on_commit(db, lambda: availability.invalidate(admin_id))
+    return created
+
+
+async def _is_admin_rule(db: AsyncSession, admin_id: int, rule_id: int) -> bool:
+    return await db.scalar(
+        select(
+            exists().where(
+                AvailabilityRule.id == rule_id, AvailabilityRule.admin_id == admin_id
+            )
+        )
+    )
+
+
+async def _delete_free_rule_slots(db: AsyncSession, rule_id: int, *conditions):
+    # Свободные слоты правила удаляем, занятые учениками остаются как есть
+    await db.execute(
+        delete(TimeSlot).where(
+            TimeSlot.rule_id == rule_id,
+            TimeSlot.student_id == None,
+            TimeSlot.is_booked == False,
+            *conditions,
+        ),
+        execution_options={"synchronize_session": False},
+    )
+
+
+async def delete_rule(db: AsyncSession, admin_id: int, rule_id: int) -> bool:
+    if not await _is_admin_rule(db, admin_id, rule_id):
+        return False
+    await _delete_free_rule_slots(db, rule_id, TimeSlot.start_time >= datetime.now())
+    await db.execute(
+        update(TimeSlot).where(TimeSlot.rule_id == rule_id).values(rule_id=None),
+        execution_options={"synchronize_session": False},
+    )
+    await db.execute(delete(RuleException).where(RuleException.rule_id == rule_id))
+    await db.execute(delete(RuleMonth).where(RuleMonth.rule_id == rule_id))
+    await db.execute(delete(AvailabilityRule).where(AvailabilityRule.id == rule_id))
+    on_commit(db, lambda: availability.invalidate(admin_id))
+    return True
+
+
+async def skip_rule_day(
+    db: AsyncSession, admin_id: int, rule_id: int, day: date
+) -> bool:
+    """Исключение правила на день: свободный слот этого дня тоже убирается"""
+    if not await _is_admin_rule(db, admin_id, rule_id):
+        return False
+    await db.execute(
+        dialect_insert(db, RuleException.__table__)
+        .values(rule_id=rule_id, day=day)
+        .on_conflict_do_nothing()
+    )
+    await _delete_free_rule_slots(
+        db,
+        rule_id,
+        TimeSlot.start_time >= datetime.combine(day, time.min),
+        TimeSlot.start_time < datetime.combine(day + timedelta(days=1), time.min),
+    )
+    on_commit(db, lambda: availability.invalidate(admin_id))
+    return True
+
+
+async def materialize_month(
+    db: AsyncSession, admin_id: int, year: int, month: int, min_date: date
+) -> int:
+    """Создаёт слоты правил на месяц (с min_date), если это ещё не сделано"""
+    start, end = month_bounds(year, month)
+    start = max(start, min_date)
+    if start >= end:
+        return 0
+
+    already_done = exists().where(
+        RuleMonth.rule_id == AvailabilityRule.id,
+        RuleMonth.year == year,
+        RuleMonth.month == month,
+    )
+    rules = list(
+        await db.scalars(
+            select(AvailabilityRule).where(
+                AvailabilityRule.admin_id == admin_id,
+                AvailabilityRule.valid_from < end,
+                or_(
+                    AvailabilityRule.valid_until == None,
+                    AvailabilityRule.valid_until >= start,
+                ),
+                ~already_done,
+            )
+        )
+    )
+    if not rules:
+        return 0
+
+    skipped = set(
+        (
+            await db.execute(
+                select(RuleException.rule_id, RuleException.day).where(
+                    RuleException.rule_id.in_([rule.id for rule in rules]),
+                    RuleException.day >= start,
+                    RuleException.day < end,
+                )
+            )
+        ).all()
+    )
+
+    slots = []
+    for rule in rules:
+        day = start + timedelta(days=(rule.weekday - start.weekday()) % 7)
+        while day < end:
+            if (
+                day >= rule.valid_from
+                and (rule.valid_until is None or day <= rule.valid_until)
+                and (rule.id, day) not in skipped
+            ):
+                slots.append(
+                    {
+                        "admin_id": admin_id,
+                        "start_time": datetime.combine(day, rule.start_time),
+                        "end_time": datetime.combine(day, rule.end_time),
+                        "is_booked": False,
+                        "rule_id": rule.id,
+                    }
+                )
+            day += timedelta(days=7)
+
+    created = 0
+    if slots:
+        # Совпадающий или пересекающийся слот админа остаётся, этот пропускается
+        result = await db.execute(
+            dialect_insert(db, TimeSlot.__table__)
+            .values(slots)
+            .on_conflict_do_nothing()
+            .returning(TimeSlot.id)
+        )
+        created = len(result.all())
+    await db.execute(
+        dialect_insert(db, RuleMonth.__table__)
+        .values([{"rule_id": rule.id, "year": year, "month": month} for rule in rules])
+        .on_conflict_do_nothing()
+    )
+    return created
@@ -0,0 +1,252 @@
+import re
+from datetime import datetime
+from typing import NamedTuple
+
+from sqlalchemy import Row, delete, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import dialect_insert
+from models import ArchivedTimeSlot, TimeSlot, User
+
+# Каждая операция — один условный UPDATE/DELETE ... RETURNING: проверка
+# состояния слота и его изменение происходят атомарно в базе, поэтому два
+# одновременных нажатия не могут оба «выиграть».
+
+SLOT_COLUMNS = (TimeSlot.id, TimeSlot.admin_id, TimeSlot.start_time, TimeSlot.end_time)
+
+
+class StudentSlot(NamedTuple):
+    """Изменённый слот и telegram_id ученика, которого это касается"""
+
+    id: int
+    admin_id: int
+    start_time: datetime
+    end_time: datetime
+    telegram_id: int
+
+
+async def _first(db: AsyncSession, statement) -> Row | None:
+    result = await db.execute(
+        statement, execution_options={"synchronize_session": False}
+    )
+    return result.first()
+
+
+async def request_slot(db: AsyncSession, slot_id: int, student_id: int) -> Row | None:
+    # Заявка ученика: только если слот ещё никем не занят
+    return await _first(
+        db,
+        update(TimeSlot)
+        .where(
+            TimeSlot.id == slot_id,
+            TimeSlot.student_id == None,
+            TimeSlot.is_booked == False,
+        )
+        .values(student_id=student_id, is_booked=False)
+        .returning(*SLOT_COLUMNS),
+    )
+
+
+async def _update_student_slot(
+    db: AsyncSession, slot_id: int, conditions: list, values: dict
+) -> StudentSlot | None:
+    if db.get_bind().dialect.name == "postgresql":
+        # UPDATE ... FROM users: RETURNING видит строку ученика до изменения
+        row = await _first(
+            db,
+            update(TimeSlot)
+            .where(TimeSlot.id == slot_id, TimeSlot.student_id == User.id, *conditions)
+            .values(**values)
+            .returning(*SLOT_COLUMNS, User.telegram_id),
+        )
+        return StudentSlot(*row) if row else None
+
+    # Остальные базы (SQLite) не отдают из RETURNING чужие таблицы:
+    # читаем ученика и меняем слот, только если ученик всё тот же
+    student = (
+        await db.execute(
+            select(TimeSlot.student_id, User.telegram_id)
+            .join(User, User.id == TimeSlot.student_id)
+            .where(TimeSlot.id == slot_id, *conditions)
+        )
+    ).first()
+    if not student:
+        return None
+    row = await _first(
+        db,
+        update(TimeSlot)
+        .where(
+            TimeSlot.id == slot_id,
+            TimeSlot.student_id == student.student_id,
+            *conditions,
+        )
+        .values(**values)
+        .returning(*SLOT_COLUMNS),
+    )
+    return StudentSlot(*row, student.telegram_id) if row else None
+
+
+async def approve_slot(db: AsyncSession, slot_id: int) -> StudentSlot | None:
+    # Админ подтверждает заявку, которая всё ещё ждёт подтверждения
+    return await _update_student_slot(
+        db, slot_id, [TimeSlot.is_booked == False], {"is_booked": True}
+    )
+
+
+async def reject_slot(db: AsyncSession, slot_id: int) -> StudentSlot | None:
+    # Админ отклоняет заявку, слот снова свободен
+    return await _update_student_slot(
+        db, slot_id, [TimeSlot.is_booked == False], {"student_id": None}
+    )
+
+
+async def cancel_lesson(
+    db: AsyncSession, slot_id: int, student_id: int | None = None
+) -> StudentSlot | None:
+    # Отмена занятия админом (любого ученика) или самим учеником (только своего)
+    conditions = []
+    if student_id is not None:
+        conditions.append(TimeSlot.student_id == student_id)
+    return await _update_student_slot(
+        db, slot_id, conditions, {"student_id": None, "is_booked": False}
+    )
+
+
+async def delete_free_slot(db: AsyncSession, slot_id: int) -> Row | None:
+    # Удалить можно только слот, на который никто не записался
+    return await _first(
+        db,
+        delete(TimeSlot)
+        .where(
+            TimeSlot.id == slot_id,
+            TimeSlot.student_id == None,
+            TimeSlot.is_booked == False,
+        )
+        .returning(*SLOT_COLUMNS),
+    )
+
+
+TIME_RANGE = re.compile(r"^(\d{2}:\d{2})\s*-\s*(\d{2}:\d{2})$")
+
+
+def parse_time_ranges(
+    date_str: str, text: str
+) -> tuple[list[tuple[datetime, datetime]], list[str]]:
+    """Интервалы HH:MM - HH:MM по одному на строку или через запятую: верные и нераспознанные"""
+    ranges, invalid = {}, []
+    for item in re.split(r"[,\n]", text):
+        item = item.strip()
+        if not item:
+            continue
+        match = TIME_RANGE.match(item)
+        if not match:
+            invalid.append(item)
+            continue
+        try:
+            start, end = [
+                datetime.strptime(f"{date_str} {value}", "%d-%m-%Y %H:%M")
+                for value in match.groups()
+            ]
+        except ValueError:  # например, 25:00
+            invalid.append(item)
+            continue
+        if end <= start:
+            invalid.append(item)
+            continue
+        # Повтор в одном сообщении — тот же слот
+        ranges[(start, end)] = None
+    return list(ranges), invalid
+
+
+async def create_slots(
+    db: AsyncSession, admin_id: int, ranges: list[tuple[datetime, datetime]]
+) -> list[Row]:
+    # Один INSERT на все интервалы. Дубли и пересечения с другими слотами
+    # админа (в том числе внутри этого же списка) база пропускает сама:
+    # уникальный индекс, EXCLUDE в PostgreSQL или триггер в SQLite
+    stmt = dialect_insert(db, TimeSlot.__table__).values(
+        [
+            {
+                "admin_id": admin_id,
+                "start_time": start,
+                "end_time": end,
+                "is_booked": False,
+            }
+            for start, end in ranges
+        ]
+    )
+    result = await db.execute(stmt.on_conflict_do_nothing().returning(*SLOT_COLUMNS))
+    return sorted(result.all(), key=lambda slot: slot.start_time)
+
+
+# Фильтры расписания админа: ключ попадает в callback_data страницы.
+# В time_slots лежат только текущие и будущие слоты, закончившиеся
+# переносит в архив services.archive — его показывает фильтр «history»
+SCHEDULE_FILTERS = {
+    "all": lambda slot: (),
+    "free": lambda slot: (slot.student_id == None, slot.is_booked == False),
+    "pending": lambda slot: (slot.student_id != None, slot.is_booked == False),
+    "booked": lambda slot: (slot.is_booked == True,),
+    "history": lambda slot: (),
+}
+
+
+async def get_schedule_page(
+    db: AsyncSession,
+    admin_id: int,
+    status: str,
+    cursor: tuple[datetime, int] | None,
+    backward: bool,
+    page_size: int,
+) -> tuple[list[TimeSlot | ArchivedTimeSlot], bool, bool]:
+    """Страница слотов админа по ключу (start_time, id) и есть ли страницы до/после"""
+    if status == "history":
+        # История — из архива, от новых к старым
+        slot, newest_first = ArchivedTimeSlot, True
+        conditions = ()
+    else:
+        slot, newest_first = TimeSlot, False
+        # Ещё не перенесённые в архив закончившиеся слоты не показываем
+        conditions = (TimeSlot.end_time >= datetime.now(),)
+
+    key = tuple_(slot.start_time, slot.id)
+    query = select(slot).where(
+        slot.admin_id == admin_id, *conditions, *SCHEDULE_FILTERS[status](slot)
+    )
+    # Назад по возрастанию — то же, что вперёд по убыванию
+    descending = backward != newest_first
+    if descending:
+        if cursor is not None:
+            query = query.where(key < tuple_(*cursor))
+        query = query.order_by(slot.start_time.desc(), slot.id.desc())
+    else:
+        if cursor is not None:
+            query = query.where(key > tuple_(*cursor))
+        query = query.order_by(slot.start_time, slot.id)
+
+    # Берём на одну строку больше, чтобы узнать, есть ли следующая страница
+    slots = list((await db.scalars(query.limit(page_size + 1))).all())
+    has_more = len(slots) > page_size
+    slots = slots[:page_size]
+
+    if backward:
+        slots.reverse()
+        return slots, has_more, cursor is not None
+    return slots, cursor is not None, has_more
+
+
+async def get_lesson_history(
+    db: AsyncSession, student_id: int, limit: int
+) -> list[ArchivedTimeSlot]:
+    """Последние прошедшие занятия ученика из архива, от новых к старым"""
+    return list(
+        await db.scalars(
+            select(ArchivedTimeSlot)
+            .where(
+                ArchivedTimeSlot.student_id == student_id,
+                ArchivedTimeSlot.is_booked == True,
+            )
+            .order_by(ArchivedTimeSlot.start_time.desc())
+            .limit(limit)
+        )
+    )
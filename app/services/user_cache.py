@@ -0,0 +1,57 @@
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import USER_CACHE_SIZE, USER_CACHE_TTL
+from models import User
+
+
+class UserIdCache:
+    """LRU-кэш telegram_id -> users.id с ограниченным временем жизни записей"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: OrderedDict[int, tuple[int, float]] = OrderedDict()
+
+    def get(self, telegram_id: int) -> int | None:
+        item = self._items.get(telegram_id)
+        if item is None:
+            return None
+        user_id, expires_at = item
+        if expires_at < time.monotonic():
+            del self._items[telegram_id]
+            return None
+        self._items.move_to_end(telegram_id)
+        return user_id
+
+    def put(self, telegram_id: int, user_id: int):
+        self._items[telegram_id] = (user_id, time.monotonic() + self.ttl)
+        self._items.move_to_end(telegram_id)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def drop(self, telegram_id: int):
+        self._items.pop(telegram_id, None)
+
+
+user_ids = UserIdCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+
+async def get_user_id(db: AsyncSession, telegram_id: int) -> int | None:
+    # Сначала смотрим в кэш, в базу идём только при промахе
+    user_id = user_ids.get(telegram_id)
+    if user_id is None:
+        user_id = await db.scalar(
+            select(User.id).where(User.telegram_id == telegram_id)
+        )
+        if user_id is not None:
+            user_ids.put(telegram_id, user_id)
+    return user_id
+
+
+@event.listens_for(User, "after_delete")
+def _drop_deleted_user(mapper, connection, target: User):
+    user_ids.drop(target.telegram_id)
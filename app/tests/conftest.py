@@ -0,0 +1,72 @@
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Модули бота импортируются плоско, как при запуске из app/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Модули бота читают окружение при импорте, поэтому до них. Бюджет запросов
+# в тестах не пишет в лог, а роняет апдейт
+os.environ["DB_URL"] = f"sqlite:///{Path(tempfile.mkdtemp()) / 'test.db'}"
+os.environ["QUERY_BUDGET_MODE"] = "raise"
+os.environ["TOKEN"] = "42:TEST"
+os.environ["ADMIN_ID"] = "1"
+os.environ["METRICS_PORT"] = "0"
+
+
+@pytest.fixture(scope="session")
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def api(loop):
+    """Заглушка Bot API: что бот отправил, видно в api.calls и api.last"""
+    from fake_bot_api import FakeBotApi
+
+    api = FakeBotApi()
+    loop.run_until_complete(api.start())
+    yield api
+    loop.run_until_complete(api.stop())
+
+
+@pytest.fixture(scope="session")
+def app(loop, api):
+    """Приложение из create_app с базой SQLite и заглушкой Bot API"""
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+
+    from bot_instance import get_bot
+    from database import get_engine, run_migrations
+    from main import create_app
+
+    loop.run_until_complete(run_migrations())
+    dispatcher = create_app()
+    bot = get_bot()
+    bot.session = AiohttpSession(api=TelegramAPIServer.from_base(api.base_url))
+    yield dispatcher
+    loop.run_until_complete(bot.session.close())
+    # Соединения aiosqlite держат свои потоки — без dispose pytest не завершится
+    loop.run_until_complete(get_engine().dispose())
+
+
+@pytest.fixture
+def feed(loop, app):
+    """Прогоняет JSON апдейта через dp, как polling"""
+    from aiogram.types import Update
+
+    from bot_instance import get_bot
+
+    def feed(update: dict):
+        bot = get_bot()
+        return loop.run_until_complete(
+            app.feed_update(bot, Update.model_validate(update, context={"bot": bot}))
+        )
+
+    return feed
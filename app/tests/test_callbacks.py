@@ -0,0 +1,23 @@
+import pytest
+
+from keyboards.callbacks import ChangeMonth, ViewCalendar
+
+
+@pytest.mark.parametrize("factory", [ChangeMonth, ViewCalendar])
+def test_month_buttons_unpack_current_format(factory):
+    button = factory(year=2026, month=11)
+    assert factory.unpack(button.pack()) == button
+
+
+@pytest.mark.parametrize("factory", [ChangeMonth, ViewCalendar])
+def test_month_buttons_unpack_legacy_format(factory):
+    # Кнопки, отправленные до перехода на CallbackData
+    assert factory.unpack(f"{factory.__prefix__}:2026-11") == factory(
+        year=2026, month=11
+    )
+
+
+def test_month_button_with_broken_data_is_rejected():
+    # PrefixRouter ловит обе ошибки разбора и отвечает «кнопка устарела»
+    with pytest.raises((TypeError, ValueError)):
+        ViewCalendar.unpack("view_calendar:2026-xx")
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+import pytest
+from aiogram import Router, types
+from aiogram.filters import Command
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fake_bot_api import UpdateFactory
+from middlewares.query_budget import QueryBudgetExceeded
+from models import TimeSlot, User
+
+STUDENT_TELEGRAM_ID = 2
+
+# Хендлеры только для тестов: регистрируются так же, как настоящие
+router = Router()
+
+
+@router.message(Command("two_queries"), flags={"query_budget": 1})
+async def two_queries_handler(message: types.Message, db: AsyncSession):
+    await db.scalar(select(func.count()).select_from(User))
+    await db.scalar(select(func.count()).select_from(TimeSlot))
+
+
+@router.message(Command("two_queries_in_budget"), flags={"query_budget": 2})
+async def two_queries_in_budget_handler(message: types.Message, db: AsyncSession):
+    await two_queries_handler(message, db)
+
+
+@router.message(Command("lazy_student"))
+async def lazy_student_handler(message: types.Message, db: AsyncSession):
+    slot = await db.scalar(select(TimeSlot).where(TimeSlot.student_id.is_not(None)))
+    # Как в синхронном коде: связь без joinedload догружается отдельным запросом
+    await db.run_sync(lambda session: slot.student)
+
+
+@pytest.fixture(scope="module")
+def updates(loop, app):
+    from database import SessionLocal
+
+    app.include_router(router)
+
+    async def seed():
+        async with SessionLocal.begin() as db:
+            admin, student = (
+                await db.scalars(
+                    insert(User)
+                    .values(
+                        [
+                            {"telegram_id": 1, "username": "admin"},
+                            {"telegram_id": STUDENT_TELEGRAM_ID, "username": "student"},
+                        ]
+                    )
+                    .returning(User.id)
+                )
+            ).all()
+            start = datetime.now().replace(microsecond=0) + timedelta(days=1)
+            await db.execute(
+                insert(TimeSlot).values(
+                    admin_id=admin,
+                    student_id=student,
+                    start_time=start,
+                    end_time=start + timedelta(hours=1),
+                    is_booked=True,
+                )
+            )
+
+    loop.run_until_complete(seed())
+    return UpdateFactory()
+
+
+def test_handler_within_budget(feed, updates):
+    feed(updates.message(STUDENT_TELEGRAM_ID, "/two_queries_in_budget"))
+
+
+def test_handler_over_budget_raises(feed, updates):
+    with pytest.raises(QueryBudgetExceeded, match="2 запросов к базе при бюджете 1"):
+        feed(updates.message(STUDENT_TELEGRAM_ID, "/two_queries"))
+
+
+def test_lazy_load_raises(feed, updates):
+    with pytest.raises(QueryBudgetExceeded, match="Ленивая загрузка"):
+        feed(updates.message(STUDENT_TELEGRAM_ID, "/lazy_student"))
+
+
+def test_bot_handlers_within_budget(feed, updates, api):
+    # Настоящие хендлеры с их флагами не падают в режиме raise и доходят
+    # до ответа пользователю
+    feed(updates.message(STUDENT_TELEGRAM_ID, "/start"))
+    assert api.last["sendmessage"]["text"].endswith("Выберите действие:")
+
+    answered = api.calls["answercallbackquery"]
+    feed(updates.callback(STUDENT_TELEGRAM_ID, "sign_up"))
+    assert api.last["editmessagetext"]["text"] == "Выбери свободный день:"
+
+    # Занятие из базы, а не «записей пока нет»
+    feed(updates.callback(STUDENT_TELEGRAM_ID, "my_lessons"))
+    assert api.last["editmessagetext"]["text"] == "Ваши занятия:"
+    assert api.calls["answercallbackquery"] == answered + 2
@@ -0,0 +1,45 @@
+import asyncio
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from config import WEB_HOST, WEB_PORT, WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_SECRET
+from health import add_health_routes
+
+
+async def set_webhook(bot: Bot, allowed_updates: list[str]):
+    # Telegram будет присылать этот секрет в X-Telegram-Bot-Api-Secret-Token
+    await bot.set_webhook(
+        url=f"{WEBHOOK_BASE_URL}{WEBHOOK_PATH}",
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=allowed_updates,
+    )
+
+
+def create_webhook_app(dp: Dispatcher, bot: Bot) -> web.Application:
+    app = web.Application()
+    # Запросы без правильного секрета отклоняются с 401
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET).register(
+        app, path=WEBHOOK_PATH
+    )
+    add_health_routes(app)
+    # Связывает startup/shutdown диспетчера с жизненным циклом aiohttp
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, allowed_updates: list[str] = None):
+    if not WEBHOOK_BASE_URL or not WEBHOOK_SECRET:
+        raise ValueError("Для режима webhook нужны WEBHOOK_BASE_URL и WEBHOOK_SECRET.")
+
+    # Раздатчик воркеров сам хендлеров не имеет — типы апдейтов передаются явно
+    dp["allowed_updates"] = allowed_updates or dp.resolve_used_update_types()
+    dp.startup.register(set_webhook)
+    runner = web.AppRunner(create_webhook_app(dp, bot))
+    await runner.setup()
+    await web.TCPSite(runner, WEB_HOST, WEB_PORT).start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import multiprocessing
+import signal
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+
+def shard_key(update: Update) -> int:
+    # Апдейты одного пользователя всегда попадают в один и тот же воркер
+    event = update.event
+    user = getattr(event, "from_user", None)
+    if user is not None:
+        return user.id
+    chat = getattr(event, "chat", None)
+    if chat is not None:
+        return chat.id
+    return update.update_id
+
+
+class ShardingMiddleware(BaseMiddleware):
+    """Не обрабатывает апдейт сам, а отдаёт его воркеру по from_user.id"""
+
+    def __init__(self, queues: list):
+        self.queues = queues
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        key = shard_key(event)
+        # put не ждёт воркер, поэтому порядок апдейтов сохраняется
+        self.queues[key % len(self.queues)].put(
+            (key, event.model_dump(mode="json", exclude_unset=True))
+        )
+        return True
+
+
+class WorkerPool:
+    """Процессы-воркеры и раздающий им апдейты диспетчер (polling или webhook)"""
+
+    def __init__(self, target: Callable, count: int):
+        # spawn работает везде и не тащит в воркер соединения родителя
+        context = multiprocessing.get_context("spawn")
+        self.queues = [context.Queue() for _ in range(count)]
+        self.processes = [
+            context.Process(
+                target=target,
+                args=(index, queue, count),
+                name=f"bot-worker-{index}",
+            )
+            for index, queue in enumerate(self.queues)
+        ]
+        self.fetcher = Dispatcher(disable_fsm=True)
+        self.fetcher.update.outer_middleware(ShardingMiddleware(self.queues))
+        self.fetcher.startup.register(self.start)
+        self.fetcher.shutdown.register(self.stop)
+
+    async def start(self):
+        for process in self.processes:
+            process.start()
+
+    async def stop(self):
+        # None — сигнал воркеру доделать свои апдейты и выйти
+        for queue in self.queues:
+            queue.put(None)
+        for process in self.processes:
+            await asyncio.to_thread(process.join)
+
+
+class UserQueues:
+    """Разные пользователи обрабатываются параллельно, один пользователь — по порядку"""
+
+    def __init__(self, dp: Dispatcher, bot: Bot):
+        self.dp = dp
+        self.bot = bot
+        self._pending: dict[int, deque] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def submit(self, key: int, update: Update):
+        if key in self._pending:
+            self._pending[key].append(update)
+            return
+        self._pending[key] = deque([update])
+        task = asyncio.create_task(self._drain(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _drain(self, key: int):
+        pending = self._pending[key]
+        while pending:
+            update = pending.popleft()
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception:
+                logger.exception("Ошибка при обработке апдейта %s", update.update_id)
+        del self._pending[key]
+
+    async def join(self):
+        while self._tasks:
+            await asyncio.gather(*self._tasks)
+
+
+async def serve_queue(dp: Dispatcher, bot: Bot, queue):
+    # Ctrl+C получает вся группа процессов; воркер выходит по None от раздатчика
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    loop = asyncio.get_running_loop()
+    users = UserQueues(dp, bot)
+    workflow_data = {"dispatcher": dp, "bots": [bot], **dp.workflow_data}
+    await dp.emit_startup(bot=bot, **workflow_data)
+    try:
+        while True:
+            item = await loop.run_in_executor(None, queue.get)
+            if item is None:
+                break
+            key, data = item
+            users.submit(key, Update.model_validate(data, context={"bot": bot}))
+        await users.join()
+    finally:
+        try:
+            await dp.emit_shutdown(bot=bot, **workflow_data)
+        finally:
+            await bot.session.close()